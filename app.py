@@ -1,18 +1,18 @@
+import hashlib
 import logging
-from logging.handlers import RotatingFileHandler
-from flask import Flask, render_template, request, jsonify
+from flask import Blueprint, Flask, Response, render_template, request, jsonify, g, stream_with_context
 from decouple import config
 from github_api import (
-    get_followers,
-    get_following,
     follow_user,
     unfollow_user,
     bulk_follow_users,
     bulk_unfollow_users,
-    get_followers_with_counts,
-    get_users_info,
     get_random_users,
     check_if_user_follows_viewer,
+    check_users_follow_viewer,
+    get_token_pool_status,
+    get_mutation_pacer_status,
+    probe_follow_lists,
 )
 from data_manager import (
     load_previous_followers,
@@ -23,171 +23,323 @@ from data_manager import (
     add_to_ignore_list,
     remove_from_ignore_list,
 )
+import change_log
+import deadlines
+import follow_scoring
+import profile_cache
+import snapshot_store
+import warmer
+from responses import json_response
+from export import EXPORT_FORMATS, EXPORT_TYPES, iter_csv, iter_export_rows, iter_ndjson
+from utils import preview
+from views import by_login
+from walks import IncompleteWalk
+from tracing import begin_trace, end_trace, get_recent_traces, get_slow_queries
 from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-import random
-import atexit
 
-# Import the task functions from the separate files
-from daily_tasks import run_daily_tasks
-from monthly_tasks import run_monthly_tasks
+GITHUB_USERNAME = config('GITHUB_USERNAME')
 
-app = Flask(__name__)
+# Whether this process should try to run the scheduled jobs. Only one process ever
+# does (see scheduler.acquire_leader_lock), so leaving this on for every worker is safe.
+RUN_SCHEDULER = config('RUN_SCHEDULER', default=True, cast=bool)
+# Seconds a /get_data request may spend on GitHub before answering with what it has
+GET_DATA_DEADLINE = config('GET_DATA_DEADLINE', default=25, cast=float)
 
-GITHUB_USERNAME = config('GITHUB_USERNAME')
+# Most events one /api/changes response returns; clients call again while `more` is true
+CHANGES_PAGE_SIZE = config('CHANGES_PAGE_SIZE', default=1000, cast=int)
 
-LOG_FILE = 'app.log'
+# Lists /get_data serves straight from the snapshot, cacheable by its version
+SNAPSHOT_LISTS = ('followers', 'following', 'not_following_back', 'users_more_following')
+# Everything /get_data?type= accepts, alone or comma-separated
+DATA_TYPES = SNAPSHOT_LISTS + ('new_followers', 'unfollowers', 'suggested_users')
 
-# Set up logging configuration
 logger = logging.getLogger()
-logger.setLevel(logging.DEBUG)  # Set the logging level
 
-# Create handlers
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)  # Set level for console handler
+bp = Blueprint('main', __name__)
+
+
+def create_app(run_scheduler=None):
+    """Build the Flask application.
 
-file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5)
-file_handler.setLevel(logging.DEBUG)  # Set level for file handler
+    Logging is configured and the scheduler role is started here rather than at
+    import time, so importing this module has no side effects. The scheduler and
+    task modules are only imported when this process actually runs jobs.
+    """
+    from logging_config import configure_logging
 
-# Create formatter and add it to the handlers
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
-console_handler.setFormatter(formatter)
-file_handler.setFormatter(formatter)
+    configure_logging()
 
-# Add the handlers to the logger
-if not logger.handlers:
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    app = Flask(__name__)
+    app.register_blueprint(bp)
 
-# Initialize the scheduler
-scheduler = BackgroundScheduler()
+    if run_scheduler is None:
+        run_scheduler = RUN_SCHEDULER
+    if run_scheduler:
+        from scheduler import start_background_scheduler
+        app.extensions['scheduler'] = start_background_scheduler()
 
-# Schedule the daily task at 6 am every day
-scheduler.add_job(run_daily_tasks, 'cron', hour=6)
+    return app
 
-# Schedule the monthly task at 1 am on the first day of each month
-scheduler.add_job(run_monthly_tasks, 'cron', day=1, hour=1)
+@bp.before_app_request
+def start_request_trace():
+    # Don't let static assets and trace inspection crowd real requests out of the ring buffer
+    if request.path.startswith(('/static/', '/debug/')):
+        return
+    g.trace_span, g.trace_token = begin_trace(
+        f'{request.method} {request.path}',
+        endpoint=request.endpoint,
+        args=request.args.to_dict(),
+    )
 
-# Start the scheduler
-scheduler.start()
+@bp.teardown_app_request
+def finish_request_trace(error=None):
+    trace_span = g.pop('trace_span', None)
+    if trace_span is not None:
+        end_trace(trace_span, g.pop('trace_token'), error)
 
-# Ensure Flask shuts down gracefully
-atexit.register(lambda: scheduler.shutdown())
+@bp.after_app_request
+def record_response_status(response):
+    trace_span = g.get('trace_span')
+    if trace_span is not None:
+        trace_span.set_attribute('status', response.status_code)
+    return response
 
-@app.route('/')
+@bp.route('/')
 def index():
     logger.info('Loading index page')
+    warmer.record_dashboard_hit()
     return render_template('index.html')
 
-@app.route('/get_data')
+def _snapshot_rows(snapshot, data_type):
+    if data_type in ('followers', 'following'):
+        return snapshot.get(data_type, [])
+    # Materialized when the snapshot was taken, enrichment included
+    return snapshot.get('views', {}).get(data_type, [])
+
+def _is_partial(snapshot, data_types):
+    """Whether lists built from this snapshot are incomplete.
+
+    That is when the snapshot itself is partial, the request deadline has cut
+    enrichment short, or not_following_back is requested and the sync that built
+    it couldn't enrich every row (they fell back to the following walk's fields).
+    """
+    if deadlines.expired() or (snapshot and snapshot.get('partial')):
+        return True
+    return bool('not_following_back' in data_types and snapshot
+                and snapshot.get('views', {}).get('not_following_back_unenriched'))
+
+def _snapshot_response(data_types, snapshot, ignore_list):
+    """Serve lists from the snapshot with the ignore list applied, keyed by type.
+
+    The ETag comes from the requested types, the snapshot version and the ignore
+    list, so a repeat request is answered with 304 without filtering or
+    serializing anything. Partial results (see _is_partial) are flagged and get
+    an ETag from their body instead.
+    """
+    ignore_set = set(ignore_list)
+
+    def build():
+        return {data_type: [row for row in _snapshot_rows(snapshot, data_type) if row.login.lower() not in ignore_set]
+                for data_type in data_types}
+
+    if _is_partial(snapshot, data_types):
+        return json_response(dict(build(), partial=True))
+    ignore_hash = hashlib.sha1('\n'.join(sorted(ignore_set)).encode('utf-8')).hexdigest()[:12]
+    return json_response(build, version=f"{','.join(data_types)}:{snapshot.get('version', 0)}:{ignore_hash}")
+
+def _flag_partial(data, snapshot=None):
+    """Mark a payload partial if its snapshot was, or the request deadline cut enrichment short."""
+    if _is_partial(snapshot, data):
+        data['partial'] = True
+    return data
+
+
+def _recent_new_followers(snapshot, previous_followers, stored_new_followers, ignore_list, now):
+    """New followers from the last 3 days, keyed by login with when each was first seen.
+
+    Followers not in previous_followers are added with `now`; stored_new_followers
+    itself is left unchanged.
+    """
+    current_followers = [user.login for user in snapshot.get('followers', [])]
+    new_followers = set(current_followers) - set(previous_followers)
+    recent = dict(stored_new_followers)
+    for follower in new_followers:
+        # Apply ignore list
+        if follower.lower() not in ignore_list and follower not in recent:
+            recent[follower] = now.isoformat()
+    return {
+        user: timestamp
+        for user, timestamp in recent.items()
+        if datetime.fromisoformat(timestamp) >= now - timedelta(days=3)
+    }
+
+
+def _unfollowers(snapshot, previous_followers, ignore_list):
+    current_followers = [user.login for user in snapshot.get('followers', [])]
+    unfollowers = list(set(previous_followers) - set(current_followers))
+    # Apply ignore list
+    return [user for user in unfollowers if user.lower() not in ignore_list]
+
+
+def _enriched_lists(data_types, snapshot, previous_followers, stored_new_followers, ignore_list, now):
+    """new_followers and unfollowers, whichever were requested, enriched in one profile batch."""
+    logins = {}
+    if 'new_followers' in data_types:
+        recent_new_followers = _recent_new_followers(
+            snapshot, previous_followers, stored_new_followers, ignore_list, now)
+        save_new_followers(recent_new_followers)
+        logins['new_followers'] = list(recent_new_followers)
+    if 'unfollowers' in data_types:
+        # Missing from a partial follower list doesn't mean someone unfollowed
+        logins['unfollowers'] = [] if snapshot.get('partial') else _unfollowers(
+            snapshot, previous_followers, ignore_list)
+
+    unique_logins = list({login.lower(): login for group in logins.values() for login in group}.values())
+    profiles = by_login(profile_cache.get_profiles(unique_logins)) if unique_logins else {}
+    return {data_type: [profiles[login.lower()] for login in group if login.lower() in profiles]
+            for data_type, group in logins.items()}
+
+
+@bp.route('/get_data')
+@deadlines.with_deadline(GET_DATA_DEADLINE)
 def get_data():
-    data_type = request.args.get('type')
-    logger.info(f'Fetching data for {data_type}')
+    """Serve one or more lists, e.g. ?type=followers or ?type=followers,unfollowers.
 
-    # Load necessary data files
-    previous_followers = load_previous_followers()
-    stored_new_followers = load_new_followers()
-    ignore_list = load_ignore_list()
+    All requested lists share one snapshot and one profile enrichment batch, and
+    come back keyed by type.
+    """
+    data_type = request.args.get('type') or ''
+    # Duplicates are dropped, order kept
+    data_types = list(dict.fromkeys(name.strip() for name in data_type.split(',') if name.strip()))
+    # ?refresh=1 skips the snapshot TTL and walks GitHub again
+    refresh = request.args.get('refresh') == '1'
+    logger.info(f'Fetching data for {data_type}')
+    warmer.record_dashboard_hit()
 
-    current_time = datetime.now()
+    if not data_types or any(name not in DATA_TYPES for name in data_types):
+        logger.error(f'Invalid data type requested: {data_type}')
+        return jsonify({'error': 'Invalid data type requested'}), 400
 
-    # Fetch data based on the requested type
     try:
-        if data_type == 'followers':
-            current_followers = get_followers_with_counts()
-            # Apply ignore list
-            current_followers = [user for user in current_followers if user['login'].lower() not in ignore_list]
-            data = {'followers': current_followers}
-            return jsonify(data)
-        elif data_type == 'following':
-            current_following = get_following()
-            # Apply ignore list
-            current_following = [f for f in current_following if f['login'].lower() not in ignore_list]
-            data = {'following': current_following}
-            return jsonify(data)
-        elif data_type == 'new_followers':
-            current_followers = get_followers()
-            new_followers = list(set(current_followers) - set(previous_followers))
-            # Apply ignore list
-            new_followers = [user for user in new_followers if user.lower() not in ignore_list]
-            # Update stored_new_followers
-            for follower in new_followers:
-                if follower not in stored_new_followers:
-                    stored_new_followers[follower] = current_time.isoformat()
-            recent_new_followers = {
-                user: timestamp
-                for user, timestamp in stored_new_followers.items()
-                if datetime.fromisoformat(timestamp) >= current_time - timedelta(days=3)
-            }
-            save_new_followers(recent_new_followers)
-            new_followers_info = get_users_info(list(recent_new_followers.keys()))
-            data = {'new_followers': new_followers_info}
-            return jsonify(data)
-        elif data_type == 'unfollowers':
-            current_followers = get_followers()
-            unfollowers = list(set(previous_followers) - set(current_followers))
-            # Apply ignore list
-            unfollowers = [user for user in unfollowers if user.lower() not in ignore_list]
-            unfollowers_info = get_users_info(unfollowers)
-            data = {'unfollowers': unfollowers_info}
-            return jsonify(data)
-        elif data_type == 'not_following_back':
-            current_followers = get_followers()
-            current_following = get_following()
-            current_follower_logins = set(u.lower() for u in current_followers)
-            not_following_back = [
-                f['login']
-                for f in current_following
-                if f['login'].lower() not in current_follower_logins and f['login'].lower() not in ignore_list
-            ]
-            not_following_back_info = get_users_info(not_following_back)
-            data = {'not_following_back': not_following_back_info}
-            return jsonify(data)
-        elif data_type == 'suggested_users':
+        snapshot = None
+        if any(name != 'suggested_users' for name in data_types):
+            snapshot = snapshot_store.get_snapshot(force=refresh)
+
+        ignore_list = load_ignore_list()
+        if all(name in SNAPSHOT_LISTS for name in data_types):
+            return _snapshot_response(data_types, snapshot, ignore_list)
+
+        ignore_set = set(ignore_list)
+        data = {name: [row for row in _snapshot_rows(snapshot, name) if row.login.lower() not in ignore_set]
+                for name in data_types if name in SNAPSHOT_LISTS}
+        if 'new_followers' in data_types or 'unfollowers' in data_types:
+            data.update(_enriched_lists(data_types, snapshot, load_previous_followers(), load_new_followers(),
+                                        ignore_list, datetime.now()))
+        if 'suggested_users' in data_types:
             # Fetch random users
             random_users = get_random_users()
             # Apply ignore list
-            random_users = [user for user in random_users if user['login'].lower() not in ignore_list]
-            data = {'suggested_users': random_users}
-            return jsonify(data)
-        elif data_type == 'users_more_following':
-            followers_with_counts = get_followers_with_counts()
-            users_more_following = [
-                {
-                    'login': follower['login'],
-                    'followers': follower['followers'],
-                    'following': follower['following'],
-                    'difference': follower['following'] - follower['followers']
-                }
-                for follower in followers_with_counts
-                if (follower['following'] - follower['followers'] >= 25) and follower['login'].lower() not in ignore_list
-            ]
-            # Sort users by the biggest difference
-            users_more_following.sort(key=lambda x: x['difference'], reverse=True)
-            data = {'users_more_following': users_more_following}
-            return jsonify(data)
-        else:
-            logger.error(f'Invalid data type requested: {data_type}')
-            return jsonify({'error': 'Invalid data type requested'}), 400
+            data['suggested_users'] = [user for user in random_users if user.login.lower() not in ignore_list]
+        return json_response(_flag_partial({name: data[name] for name in data_types}, snapshot))
     except Exception as e:
         logger.exception(f"Error fetching data for {data_type}: {e}")
         return jsonify({'error': 'An error occurred while fetching data'}), 500
 
-@app.route('/bulk_follow', methods=['POST'])
+@bp.route('/api/summary')
+def summary():
+    """Counts for the dashboard summary cards, without loading or enriching any list.
+
+    Follower and following totals come from a single totalCount query; the other
+    counts come from the stored snapshot and are null until one has been taken.
+    """
+    warmer.record_dashboard_hit()
+    try:
+        probe = probe_follow_lists()
+        snapshot = snapshot_store.get_stored_snapshot()
+        ignore_list = load_ignore_list()
+
+        data = {
+            'followers': probe['followers']['total'] if probe else None,
+            'following': probe['following']['total'] if probe else None,
+            'new_followers': None,
+            'unfollowers': None,
+            'not_following_back': None,
+            'snapshot_taken_at': snapshot.get('taken_at'),
+            # Lists whose size or newest entry differ from the snapshot the other counts came from
+            'changed_since_snapshot': sorted(snapshot_store.get_changed_lists(probe)),
+        }
+        if snapshot:
+            previous_followers = load_previous_followers()
+            if probe is None:
+                data['followers'] = len(snapshot['followers'])
+                data['following'] = len(snapshot['following'])
+            data['new_followers'] = len(_recent_new_followers(
+                snapshot, previous_followers, load_new_followers(), ignore_list, datetime.now()))
+            data['unfollowers'] = len(_unfollowers(snapshot, previous_followers, ignore_list))
+            data['not_following_back'] = sum(
+                1 for row in snapshot['views']['not_following_back'] if row.login.lower() not in ignore_list)
+        return json_response(data)
+    except Exception as e:
+        logger.exception(f"Error building dashboard summary: {e}")
+        return jsonify({'error': 'Failed to load summary'}), 500
+
+
+@bp.route('/api/changes')
+def changes():
+    """Follow and unfollow events since ?since=<token>, from the local snapshot history.
+
+    Pollers pay for what changed rather than for whole lists; see change_log.get_changes.
+    """
+    try:
+        limit = int(request.args.get('limit', CHANGES_PAGE_SIZE))
+    except ValueError:
+        return jsonify({'error': 'limit must be a number'}), 400
+    if limit < 1:
+        return jsonify({'error': 'limit must be at least 1'}), 400
+
+    try:
+        return json_response(change_log.get_changes(request.args.get('since'), min(limit, CHANGES_PAGE_SIZE)))
+    except Exception as e:
+        logger.exception(f"Error reading follow changes: {e}")
+        return jsonify({'error': 'Failed to load changes'}), 500
+
+
+@bp.route('/api/export/<data_type>')
+def export_list(data_type):
+    """Stream a full list as CSV or NDJSON without building it in memory."""
+    export_format = request.args.get('format', 'csv')
+    if data_type not in EXPORT_TYPES:
+        return jsonify({'error': f'Unknown list type: {data_type}'}), 400
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unknown export format: {export_format}'}), 400
+
+    logger.info(f'Exporting {data_type} as {export_format}')
+    try:
+        rows = iter_export_rows(data_type)
+    except IncompleteWalk as e:
+        # Nothing sent yet, so say so plainly instead of streaming a truncated file
+        logger.error(f"Not exporting {data_type}: {e}")
+        return jsonify({'error': str(e)}), 503
+    body = iter_csv(rows) if export_format == 'csv' else iter_ndjson(rows)
+    response = Response(stream_with_context(body), mimetype=EXPORT_FORMATS[export_format])
+    response.headers['Content-Disposition'] = f'attachment; filename={data_type}.{export_format}'
+    return response
+
+@bp.route('/bulk_follow', methods=['POST'])
 def bulk_follow():
     usernames = request.json.get('usernames', [])
-    logger.info(f'Attempting to bulk follow users: {usernames}')
+    logger.info(f'Attempting to bulk follow {len(usernames)} users: {preview(usernames)}')
     results = bulk_follow_users(usernames)
     return jsonify(results)
 
-@app.route('/bulk_unfollow', methods=['POST'])
+@bp.route('/bulk_unfollow', methods=['POST'])
 def bulk_unfollow():
     usernames = request.json.get('usernames', [])
-    logger.info(f'Attempting to bulk unfollow users: {usernames}')
+    logger.info(f'Attempting to bulk unfollow {len(usernames)} users: {preview(usernames)}')
     results = bulk_unfollow_users(usernames)
     return jsonify(results)
 
-@app.route('/unfollow/<username>', methods=['POST'])
+@bp.route('/unfollow/<username>', methods=['POST'])
 def unfollow(username):
     logger.info(f'Attempting to unfollow user: {username}')
     success, message = unfollow_user(username)
@@ -196,7 +348,7 @@ def unfollow(username):
     else:
         return jsonify({'success': False, 'message': message}), 500
 
-@app.route('/follow/<username>', methods=['POST'])
+@bp.route('/follow/<username>', methods=['POST'])
 def follow(username):
     logger.info(f'Attempting to follow user: {username}')
     success, message = follow_user(username)
@@ -206,7 +358,7 @@ def follow(username):
         return jsonify({'success': False, 'message': message}), 500
 
 # Add this route for the search functionality
-@app.route('/check_follow')
+@bp.route('/check_follow')
 def check_follow():
     username = request.args.get('username')
     if not username:
@@ -219,9 +371,49 @@ def check_follow():
         logger.exception(f"Error checking if user {username} follows viewer: {e}")
         return jsonify({'error': 'An error occurred while checking the user'}), 500
 
+# Upper bound on usernames accepted by one bulk follow-status check
+MAX_BULK_CHECK = config('MAX_BULK_CHECK', default=1000, cast=int)
+
+@bp.route('/api/check_follow_bulk', methods=['POST'])
+def check_follow_bulk():
+    data = request.get_json(silent=True) or {}
+    raw = data.get('usernames') or []
+    if isinstance(raw, str):
+        raw = raw.replace(',', ' ').split()
+    # Deduplicate while preserving order
+    usernames = list(dict.fromkeys(u.strip().lstrip('@') for u in raw if isinstance(u, str) and u.strip()))
+    if not usernames:
+        return jsonify({'error': 'At least one username is required'}), 400
+    if len(usernames) > MAX_BULK_CHECK:
+        return jsonify({'error': f'At most {MAX_BULK_CHECK} usernames can be checked at once'}), 400
+
+    logger.info(f'Checking follow status for {len(usernames)} users')
+    try:
+        follower_set = snapshot_store.get_fresh_follower_set()
+        if follower_set is not None:
+            # A fresh snapshot of our followers answers for them and for users we follow without
+            # any API call. Other names may not exist, so they are checked like the API path
+            # does, and come back as null rather than false when GitHub doesn't know them.
+            following = snapshot_store.get_stored_snapshot().get('following', [])
+            following_set = {user.login.lower() for user in following}
+            results = {u: True for u in usernames if u.lower() in follower_set}
+            results.update({u: False for u in usernames if u not in results and u.lower() in following_set})
+            unresolved = [u for u in usernames if u not in results]
+            if unresolved:
+                results.update(check_users_follow_viewer(unresolved))
+            results = {u: results.get(u) for u in usernames}
+            source = 'snapshot' if not unresolved else 'snapshot+api'
+        else:
+            results = check_users_follow_viewer(usernames)
+            source = 'api'
+        return jsonify({'results': results, 'source': source})
+    except Exception as e:
+        logger.exception(f"Error checking follow status in bulk: {e}")
+        return jsonify({'error': 'An error occurred while checking the users'}), 500
+
 
 # Ignore list management endpoints
-@app.route('/api/ignore-list', methods=['GET'])
+@bp.route('/api/ignore-list', methods=['GET'])
 def get_ignore_list():
     try:
         ignore_list = load_ignore_list()
@@ -231,7 +423,7 @@ def get_ignore_list():
         return jsonify({'error': 'Failed to load ignore list'}), 500
 
 
-@app.route('/api/ignore-list', methods=['POST'])
+@bp.route('/api/ignore-list', methods=['POST'])
 def add_ignore():
     data = request.get_json(silent=True) or {}
     username = (data.get('username') or '').strip()
@@ -245,7 +437,7 @@ def add_ignore():
         return jsonify({'error': 'Failed to add username to ignore list'}), 500
 
 
-@app.route('/api/ignore-list', methods=['DELETE'])
+@bp.route('/api/ignore-list', methods=['DELETE'])
 def remove_ignore():
     data = request.get_json(silent=True) or {}
     username = (data.get('username') or '').strip()
@@ -258,5 +450,26 @@ def remove_ignore():
         logger.exception(f"Error removing from ignore list: {e}")
         return jsonify({'error': 'Failed to remove username from ignore list'}), 500
 
+# Tracing inspection endpoint
+@bp.route('/debug/traces')
+def debug_traces():
+    limit = request.args.get('limit', default=20, type=int)
+    return jsonify({
+        'traces': get_recent_traces(limit),
+        'slow_queries': get_slow_queries(limit),
+    })
+
+@bp.route('/debug/snapshot')
+def debug_snapshot():
+    return jsonify(snapshot_store.get_probe_stats())
+
+@bp.route('/debug/follow-scoring')
+def debug_follow_scoring():
+    return jsonify(follow_scoring.get_stats())
+
+@bp.route('/debug/rate-limits')
+def debug_rate_limits():
+    return jsonify({'tokens': get_token_pool_status(), 'mutations': get_mutation_pacer_status()})
+
 if __name__ == "__main__":
-    app.run(debug=True, host='0.0.0.0', port=9999)
+    create_app().run(debug=True, host='0.0.0.0', port=9999)
@@ -0,0 +1,178 @@
+import bisect
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from decouple import config
+
+from utils import file_lock
+
+logger = logging.getLogger(__name__)
+
+# Append-only log of follow/unfollow events between snapshots, served by /api/changes
+CHANGE_LOG_FILE = config('CHANGE_LOG_FILE', default='follow_changes.jsonl')
+# Events kept; clients holding a token from before the oldest one have to reload the full lists
+CHANGE_LOG_MAX_EVENTS = config('CHANGE_LOG_MAX_EVENTS', default=20000, cast=int)
+
+EVENT_TYPES = ('follower_gained', 'follower_lost', 'followed', 'unfollowed')
+
+# Web workers and the scheduler process all append; seqs are assigned under a file
+# lock, from the file as it is then, so no two events share one.
+# The first line is a header, {'log_id': random id, 'first_seq': seq of the oldest
+# event kept}; every other line is one event, {'seq', 'type', 'login', 'at'}, with
+# seq counting up by one. A token is '<log_id>.<seq>' of the last event a client
+# has seen, so tokens from a deleted log, or from before the events kept, are
+# recognised instead of silently skipping changes.
+_lock = threading.Lock()
+# Parsed copy of the file. While the file is only appended to, just the bytes
+# after `offset` are read; a rewritten (trimmed) file is read again in full.
+_state: Dict[str, Any] = {}
+
+
+def _reset_state(inode=None) -> None:
+    _state.update(inode=inode, offset=0, log_id=None, first_seq=1, seqs=[], events=[])
+
+
+_reset_state()
+
+
+def _reload_locked() -> None:
+    try:
+        stat = os.stat(CHANGE_LOG_FILE)
+    except FileNotFoundError:
+        _reset_state()
+        return
+    if stat.st_ino != _state['inode'] or stat.st_size < _state['offset']:
+        _reset_state(stat.st_ino)
+    if stat.st_size == _state['offset']:
+        return
+
+    with open(CHANGE_LOG_FILE, 'rb') as file:
+        file.seek(_state['offset'])
+        data = file.read()
+    # A line another process is still writing is picked up next time
+    data = data[:data.rfind(b'\n') + 1]
+    for line in data.splitlines():
+        row = json.loads(line)
+        if 'log_id' in row:
+            _state.update(log_id=row['log_id'], first_seq=row['first_seq'])
+        else:
+            _state['seqs'].append(row['seq'])
+            _state['events'].append(row)
+    _state['offset'] += len(data)
+
+
+def _write_locked(log_id: str, first_seq: int, events: Sequence[Dict[str, Any]]) -> None:
+    """Replace the whole file, e.g. to start a log or drop its oldest events."""
+    tmp_file = CHANGE_LOG_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as file:
+        file.write(json.dumps({'log_id': log_id, 'first_seq': first_seq}) + '\n')
+        file.writelines(json.dumps(event, ensure_ascii=False) + '\n' for event in events)
+    os.replace(tmp_file, CHANGE_LOG_FILE)
+    _reload_locked()
+
+
+def _ensure_log_locked() -> None:
+    """Start the log if there isn't one. Call with the file lock held."""
+    _reload_locked()
+    if _state['log_id'] is None:
+        _write_locked(secrets.token_hex(4), 1, [])
+
+
+def _last_seq() -> int:
+    return _state['seqs'][-1] if _state['seqs'] else _state['first_seq'] - 1
+
+
+def _token(seq: int) -> str:
+    return f"{_state['log_id']}.{seq}"
+
+
+def diff_lists(previous_followers: Iterable[Any], followers: Iterable[Any],
+               previous_following: Iterable[Any], following: Iterable[Any]) -> List[Tuple[str, str]]:
+    """The (event type, login) pairs between two versions of the follower and following lists."""
+    def logins(users):
+        return {user.login.lower(): user.login for user in users}
+
+    changes = []
+    for (gained, lost), before, after in (
+            (('follower_gained', 'follower_lost'), logins(previous_followers), logins(followers)),
+            (('followed', 'unfollowed'), logins(previous_following), logins(following))):
+        changes.extend((gained, after[key]) for key in sorted(after.keys() - before.keys()))
+        changes.extend((lost, before[key]) for key in sorted(before.keys() - after.keys()))
+    return changes
+
+
+def record(changes: Iterable[Tuple[str, str]], at: Optional[float] = None) -> int:
+    """Append (event type, login) pairs to the log. Returns how many were written."""
+    changes = list(changes)
+    if not changes:
+        return 0
+    at = time.time() if at is None else at
+    with _lock:
+        try:
+            with file_lock(CHANGE_LOG_FILE):
+                _append_locked(changes, at)
+        except OSError as e:
+            # Only the feed misses these; the snapshot itself is already stored
+            logger.error(f"Failed to record {len(changes)} follow changes: {e}")
+            return 0
+    logger.info(f"Recorded {len(changes)} follow changes")
+    return len(changes)
+
+
+def _append_locked(changes: List[Tuple[str, str]], at: float) -> None:
+    """Append with the file lock held, numbering on from the last seq on disk."""
+    _ensure_log_locked()
+    seq = _last_seq()
+    with open(CHANGE_LOG_FILE, 'a', encoding='utf-8') as file:
+        file.writelines(
+            json.dumps({'seq': seq + index, 'type': event_type, 'login': login, 'at': at},
+                       ensure_ascii=False) + '\n'
+            for index, (event_type, login) in enumerate(changes, 1))
+    _reload_locked()
+
+    # Trim once there are a tenth more than the limit, so the file is only rewritten now and then
+    events = _state['events']
+    if len(events) > CHANGE_LOG_MAX_EVENTS + CHANGE_LOG_MAX_EVENTS // 10:
+        kept = events[-CHANGE_LOG_MAX_EVENTS:]
+        _write_locked(_state['log_id'], kept[0]['seq'], kept)
+
+
+def get_changes(token: Optional[str], limit: int) -> Dict[str, Any]:
+    """Events recorded after `token`, oldest first.
+
+    Args:
+        token: The token from the previous call, or None on a client's first call.
+        limit: Most events to return. `more` is True when there are further ones.
+
+    Returns:
+        {'events': [{'seq', 'type', 'login', 'at'}], 'token', 'more', 'reset'}.
+        `reset` is True when there was no token or it can't be continued (from
+        another log, or older than the oldest event kept): the client has to
+        reload the full lists, then poll with the returned token.
+    """
+    with _lock:
+        _reload_locked()
+        if _state['log_id'] is None:
+            with file_lock(CHANGE_LOG_FILE):
+                _ensure_log_locked()
+        last_seq = _last_seq()
+        since = None
+        log_id, _, seq = (token or '').partition('.')
+        if log_id == _state['log_id'] and seq.isdigit():
+            since = int(seq)
+        if since is None or not _state['first_seq'] - 1 <= since <= last_seq:
+            return {'events': [], 'token': _token(last_seq), 'more': False, 'reset': True}
+
+        start = bisect.bisect_right(_state['seqs'], since)
+        events = _state['events'][start:start + limit]
+        return {
+            'events': events,
+            'token': _token(events[-1]['seq'] if events else since),
+            'more': start + len(events) < len(_state['events']),
+            'reset': False,
+        }
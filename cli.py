@@ -0,0 +1,287 @@
+"""Command-line entry point for one-shot runs (cron, scripts): `python -m cli <command>`.
+
+Each command imports only the modules it needs, so nothing here loads Flask or
+starts the scheduler, and commands that can work from the stored snapshot don't
+touch the GitHub client at all. Results are written to stdout as JSON (or as
+CSV/NDJSON for `export`); logs go to stderr and the log file.
+"""
+import argparse
+import os
+import sys
+import time
+
+_started = time.perf_counter()
+
+DIFF_LISTS = ('not_following_back', 'not_followed_back', 'users_more_following', 'new_followers', 'unfollowers')
+
+
+def _write_json(payload) -> None:
+    from utils import dumps
+
+    sys.stdout.buffer.write(dumps(payload) + b'\n')
+    sys.stdout.flush()
+
+
+def _read_logins(logins):
+    """Logins from the command line, or one per line from stdin when given `-`."""
+    if logins == ['-']:
+        logins = sys.stdin.read().split()
+    return [login.strip() for login in logins if login.strip()]
+
+
+def _load_snapshot(args):
+    import snapshot_store
+
+    if args.offline:
+        return snapshot_store.get_stored_snapshot()
+    return snapshot_store.get_snapshot(max_age=args.max_age)
+
+
+def _snapshot_summary(snapshot):
+    return {
+        'version': snapshot.get('version'),
+        'taken_at': snapshot.get('taken_at'),
+        'walked_at': snapshot.get('walked_at'),
+        'followers': len(snapshot.get('followers', [])),
+        'following': len(snapshot.get('following', [])),
+        'not_following_back': len(snapshot.get('views', {}).get('not_following_back', [])),
+        'users_more_following': len(snapshot.get('views', {}).get('users_more_following', [])),
+    }
+
+
+def cmd_sync(args) -> int:
+    import snapshot_store
+
+    snapshot = snapshot_store.sync() if args.force else snapshot_store.get_snapshot()
+    _write_json(dict(_snapshot_summary(snapshot), complete=not snapshot.get('partial'),
+                     probe_stats=snapshot_store.get_probe_stats()))
+    return 1 if snapshot.get('partial') else 0
+
+
+def cmd_diff(args) -> int:
+    from data_manager import load_ignore_list, load_previous_followers
+
+    snapshot = _load_snapshot(args)
+    if not snapshot:
+        _write_json({'error': 'No snapshot stored yet; run `python -m cli sync` first'})
+        return 1
+    if snapshot.get('partial'):
+        # Lists computed from what is missing would be wrong; `sync` again resumes the walks
+        _write_json({'error': 'The follower lists could only be fetched in part; run `python -m cli sync` again',
+                     'snapshot': _snapshot_summary(snapshot)})
+        return 1
+
+    ignore_set = set(load_ignore_list())
+    followers = {user.login for user in snapshot['followers']}
+    following = {user.login for user in snapshot['following']}
+    previous_followers = set(load_previous_followers())
+    followers_lower = {login.lower() for login in followers}
+    previous_lower = {login.lower() for login in previous_followers}
+
+    lists = {
+        'not_following_back': [row.login for row in snapshot['views']['not_following_back']],
+        'not_followed_back': sorted(followers - following, key=str.lower),
+        'users_more_following': [row.login for row in snapshot['views']['users_more_following']],
+        'new_followers': sorted((login for login in followers if login.lower() not in previous_lower), key=str.lower),
+        'unfollowers': sorted((login for login in previous_followers if login.lower() not in followers_lower),
+                              key=str.lower),
+    }
+    lists = {name: [login for login in logins if login.lower() not in ignore_set] for name, logins in lists.items()}
+
+    if args.list:
+        # One login per line, e.g. to pipe into `python -m cli unfollow -`
+        for login in lists[args.list]:
+            print(login)
+        return 0
+    _write_json(dict(snapshot=_snapshot_summary(snapshot), **lists))
+    return 0
+
+
+def _bulk(args, action) -> int:
+    from utils import summarize_results
+
+    logins = _read_logins(args.logins)
+    if not logins:
+        _write_json({'summary': summarize_results({}), 'results': {}})
+        return 0
+    results = action(logins, max_workers=args.workers)
+    _write_json({'summary': summarize_results(results), 'results': results})
+    return 0 if all(outcome['success'] for outcome in results.values()) else 1
+
+
+def cmd_follow(args) -> int:
+    from github_api import bulk_follow_users
+
+    return _bulk(args, bulk_follow_users)
+
+
+def cmd_unfollow(args) -> int:
+    from github_api import bulk_unfollow_users
+
+    return _bulk(args, bulk_unfollow_users)
+
+
+def cmd_export(args) -> int:
+    from deadlines import DeadlineExceeded
+    from export import iter_csv, iter_export_rows, iter_ndjson
+    from walks import IncompleteWalk
+
+    try:
+        rows = iter_export_rows(args.data_type)
+    except IncompleteWalk as e:
+        print(f"Not exporting {args.data_type}: {e}", file=sys.stderr)
+        return 1
+
+    complete = True
+
+    def tracked_rows():
+        # iter_csv/iter_ndjson end a cut-short export with a marker line; note it for the exit code
+        nonlocal complete
+        try:
+            yield from rows
+        except (IncompleteWalk, DeadlineExceeded):
+            complete = False
+            raise
+
+    if args.format == 'csv':
+        sys.stdout.writelines(iter_csv(tracked_rows()))
+    else:
+        sys.stdout.flush()
+        sys.stdout.buffer.writelines(iter_ndjson(tracked_rows()))
+    sys.stdout.flush()
+    return 0 if complete else 1
+
+
+def cmd_suggest(args) -> int:
+    """Run the suggestion path the daily follow jobs use, and exit with 1 if it comes back empty."""
+    from follow_scoring import score_users
+    from github_api import get_random_users
+
+    users = get_random_users(limit=args.limit)
+    _write_json([dict(user.to_json(), score=round(score, 3)) for user, score in zip(users, score_users(users))])
+    return 0 if users else 1
+
+
+def cmd_changes(args) -> int:
+    from change_log import get_changes
+
+    _write_json(get_changes(args.since, args.limit))
+    return 0
+
+
+def _median(values):
+    values = sorted(values)
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def cmd_bench(args) -> int:
+    """Time the local stages of a dashboard load, plus the GitHub round trips with --live."""
+    import snapshot_store
+    from tracing import span
+    from utils import dumps
+    from views import refresh_views
+
+    import_ms = (time.perf_counter() - _started) * 1000
+    timings = {}
+
+    def measure(name, func, repeat):
+        durations = []
+        for _ in range(repeat):
+            with span(f'bench.{name}') as current:
+                func()
+            durations.append(current.duration_ms)
+        timings[name] = {'runs': repeat, 'min_ms': round(min(durations), 2),
+                         'median_ms': round(_median(durations), 2)}
+
+    snapshot = snapshot_store.get_stored_snapshot()
+    if snapshot:
+        measure('snapshot.load', snapshot_store.read_snapshot_file, args.repeat)
+        # Rebuilt from an empty previous snapshot, with enrichment stubbed out, so nothing is fetched
+        measure('views.rebuild', lambda: refresh_views({}, snapshot['followers'], snapshot['following'],
+                                                       lambda logins: []), args.repeat)
+        measure('views.refresh', lambda: refresh_views(snapshot, snapshot['followers'], snapshot['following'],
+                                                       lambda logins: []), args.repeat)
+        for data_type in ('followers', 'following'):
+            measure(f'serialize.{data_type}', lambda: dumps({data_type: snapshot[data_type]}), args.repeat)
+        for data_type in ('not_following_back', 'users_more_following'):
+            measure(f'serialize.{data_type}', lambda: dumps({data_type: snapshot['views'][data_type]}),
+                    args.repeat)
+
+    if args.live:
+        from github_api import probe_follow_lists
+
+        measure('github.probe', probe_follow_lists, args.repeat)
+        measure('snapshot.sync', snapshot_store.sync, 1)
+
+    _write_json({
+        'startup_ms': round(import_ms, 2),
+        'snapshot': _snapshot_summary(snapshot) if snapshot else None,
+        'timings': timings,
+    })
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    from export import EXPORT_FORMATS, EXPORT_TYPES
+
+    parser = argparse.ArgumentParser(prog='python -m cli', description=__doc__.splitlines()[0])
+    parser.add_argument('-v', '--verbose', action='store_true', help='log at LOG_LEVEL on stderr, not just warnings')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    sync = commands.add_parser('sync', help='bring the follower snapshot up to date')
+    sync.add_argument('--force', action='store_true', help='sync even if the snapshot is fresh')
+    sync.set_defaults(func=cmd_sync)
+
+    diff = commands.add_parser('diff', help='lists derived from the snapshot (ignore list applied)')
+    diff.add_argument('--offline', action='store_true', help='use the stored snapshot however old it is')
+    diff.add_argument('--max-age', type=int, default=None, help='sync if the snapshot is older (seconds)')
+    diff.add_argument('--list', choices=DIFF_LISTS, help='print only this list, one login per line')
+    diff.set_defaults(func=cmd_diff)
+
+    for name, func in (('follow', cmd_follow), ('unfollow', cmd_unfollow)):
+        bulk = commands.add_parser(name, help=f'{name} users in bulk')
+        bulk.add_argument('logins', nargs='+', help='logins, or - to read them from stdin')
+        bulk.add_argument('--workers', type=int, default=3)
+        bulk.set_defaults(func=func)
+
+    suggest = commands.add_parser('suggest', help='fetch and rank follow suggestions like the daily jobs do')
+    suggest.add_argument('--limit', type=int, default=10)
+    suggest.set_defaults(func=cmd_suggest)
+
+    changes = commands.add_parser('changes', help='follow/unfollow events recorded since a token')
+    changes.add_argument('--since', help='token from the previous call; without one only a token is returned')
+    changes.add_argument('--limit', type=int, default=1000)
+    changes.set_defaults(func=cmd_changes)
+
+    export = commands.add_parser('export', help='write a list to stdout as CSV or NDJSON')
+    export.add_argument('data_type', choices=EXPORT_TYPES)
+    export.add_argument('--format', choices=tuple(EXPORT_FORMATS), default='csv')
+    export.set_defaults(func=cmd_export)
+
+    bench = commands.add_parser('bench', help='time snapshot loading, view refresh and serialization')
+    bench.add_argument('--repeat', type=int, default=5)
+    bench.add_argument('--live', action='store_true', help='also time a change probe and a sync against GitHub')
+    bench.set_defaults(func=cmd_bench)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+
+    from logging_config import configure_logging
+    from tracing import start_trace
+
+    configure_logging(console_level=None if args.verbose else 'WARNING')
+    try:
+        with start_trace(f'cli:{args.command}'):
+            return args.func(args)
+    except BrokenPipeError:
+        # The reader (e.g. `head`) went away; stop quietly instead of failing again at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,12 +1,34 @@
 import logging
-import random
+import math
+import time
+from datetime import datetime, timedelta
+
+from decouple import config
+
+import follow_scoring
+from logging_config import LOG_SUMMARY_MAX_FAILURES
+from records import UserProfile
+from tracing import traced_job
+from utils import load_json_file, preview, save_json_file, summarize_results
 from github_api import (
     bulk_follow_users,
+    get_owner_budget,
     get_random_users,
 )
 
 logger = logging.getLogger('daily_tasks')
 
+# How many users to follow per day
+DAILY_FOLLOW_QUOTA = config('DAILY_FOLLOW_QUOTA', default=50, cast=int)
+# Share of the owner token's remaining hourly budget a single slot may spend
+DAILY_FOLLOW_BUDGET_SHARE = config('DAILY_FOLLOW_BUDGET_SHARE', default=0.1, cast=float)
+# Rate-limit points one follow costs (owner ID lookup plus the mutation)
+FOLLOW_COST = config('FOLLOW_COST', default=2, cast=int)
+# Progress of today's quota and the candidates still queued for it
+DAILY_FOLLOW_STATE_FILE = config('DAILY_FOLLOW_STATE_FILE', default='daily_follow_state.json')
+
+
+@traced_job
 def run_daily_tasks():
     logger.info("Starting daily tasks")
 
@@ -16,14 +38,121 @@ def run_daily_tasks():
 
     # Select 50 random users
     if suggested_users:
-        usernames = [user['login'] for user in suggested_users]
+        usernames = [user.login for user in suggested_users]
         selected_usernames = usernames  # We already fetched 50 users
 
         # Follow these users
-        logger.info(f"Following {len(selected_usernames)} users: {selected_usernames}")
+        logger.info(f"Following {len(selected_usernames)} users: {preview(selected_usernames)}")
         results = bulk_follow_users(selected_usernames)
-        logger.info(f"Follow results: {results}")
+        follow_scoring.record_follows(user for user in suggested_users
+                                      if results.get(user.login, {}).get('success'))
+        summary = summarize_results(results, LOG_SUMMARY_MAX_FAILURES)
+        logger.info(f"Follow results: {summary}", extra={'job_summary': summary})
     else:
         logger.info("No suggested users available to follow")
 
     logger.info("Daily tasks completed")
+
+
+def _load_state(today):
+    state = load_json_file(DAILY_FOLLOW_STATE_FILE)
+    if state.get('date') != today:
+        if state.get('date') and state.get('attempted', 0) < DAILY_FOLLOW_QUOTA:
+            logger.warning(f"Daily follow quota for {state['date']} was not reached "
+                           f"({state.get('attempted', 0)}/{DAILY_FOLLOW_QUOTA})")
+        state = {'date': today, 'attempted': 0, 'followed': 0, 'candidates': []}
+        save_json_file(DAILY_FOLLOW_STATE_FILE, state)
+    return state
+
+
+def _candidate(entry):
+    """A queued candidate; queues written before scoring hold bare logins."""
+    if isinstance(entry, str):
+        return UserProfile(entry)
+    return UserProfile.from_json(entry)
+
+
+def _resolve_outcomes():
+    """Settle earlier follows against the stored snapshot's followers, so scoring learns from them."""
+    import snapshot_store
+
+    snapshot = snapshot_store.get_stored_snapshot()
+    if not snapshot:
+        return
+    settled = follow_scoring.resolve_outcomes({user.login.lower() for user in snapshot['followers']},
+                                              snapshot['taken_at'])
+    if settled['followed_back'] or settled['ignored']:
+        logger.info(f"Follow outcomes: {settled['followed_back']} followed back, "
+                    f"{settled['ignored']} did not within {follow_scoring.FOLLOW_BACK_WINDOW_DAYS} days")
+
+
+def plan_slot_size(remaining_quota, remaining_slots, budget):
+    """Number of follows for the current slot.
+
+    The remaining quota is split evenly over the remaining slots, so slots missed
+    during downtime are caught up gradually rather than in one burst. A slot never
+    spends more than DAILY_FOLLOW_BUDGET_SHARE of the owner token's budget.
+    """
+    if remaining_quota <= 0 or remaining_slots <= 0:
+        return 0
+    even_share = math.ceil(remaining_quota / remaining_slots)
+    affordable = int(budget * DAILY_FOLLOW_BUDGET_SHARE) // max(FOLLOW_COST, 1)
+    return max(0, min(even_share, affordable, remaining_quota))
+
+
+@traced_job
+def run_daily_follow_slot(window_start_hour, window_end_hour, slot_minutes):
+    """Follow this slot's share of today's quota, if now is inside the follow window.
+
+    Meant to run every `slot_minutes`. Candidates are fetched once and queued in
+    DAILY_FOLLOW_STATE_FILE, so each slot only pays for its own follows.
+    """
+    now = datetime.now()
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    window_start = midnight + timedelta(hours=window_start_hour)
+    window_end = midnight + timedelta(hours=window_end_hour)
+    if not window_start <= now < window_end:
+        logger.debug("Outside the daily follow window; nothing to do")
+        return
+
+    state = _load_state(now.date().isoformat())
+    remaining_quota = DAILY_FOLLOW_QUOTA - state['attempted']
+    if remaining_quota <= 0:
+        logger.debug("Daily follow quota already reached")
+        return
+
+    remaining_slots = math.ceil((window_end - now).total_seconds() / (slot_minutes * 60))
+    budget = get_owner_budget()
+    count = plan_slot_size(remaining_quota, remaining_slots, budget)
+    logger.info(f"Follow slot: {count} follows ({remaining_quota} left today over "
+                f"{remaining_slots} slots, owner budget {budget})")
+    if count == 0:
+        return
+
+    _resolve_outcomes()
+    candidates = [_candidate(entry) for entry in state['candidates']]
+    if len(candidates) < count:
+        suggested_users = get_random_users(limit=remaining_quota)
+        queued = {user.login.lower() for user in candidates}
+        candidates.extend(user for user in suggested_users if user.login.lower() not in queued)
+        # Best prospects first, whichever batch they were fetched in
+        candidates = follow_scoring.rank_users(candidates)
+        logger.info(f"Queued {len(suggested_users)} suggested users for today's follows")
+
+    selected, candidates = candidates[:count], candidates[count:]
+    state['candidates'] = [user.to_json() for user in candidates]
+    usernames = [user.login for user in selected]
+    if not usernames:
+        logger.info("No suggested users available to follow")
+        save_json_file(DAILY_FOLLOW_STATE_FILE, state)
+        return
+
+    logger.info(f"Following {len(usernames)} users: {preview(usernames)}")
+    results = bulk_follow_users(usernames)
+    follow_scoring.record_follows(user for user in selected if results.get(user.login, {}).get('success'))
+    summary = summarize_results(results, LOG_SUMMARY_MAX_FAILURES)
+    state['attempted'] += summary['total']
+    state['followed'] += summary['succeeded']
+    state['last_slot_at'] = time.time()
+    save_json_file(DAILY_FOLLOW_STATE_FILE, state)
+    logger.info(f"Follow results: {summary}", extra={'job_summary': summary})
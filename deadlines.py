@@ -0,0 +1,75 @@
+import contextvars
+import time
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+
+# Absolute time.monotonic() by which the current request or job has to finish.
+# Context variables follow work into threads started with utils.submit_with_context.
+_deadline: contextvars.ContextVar = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    """Raised when work runs past the deadline of the request or job it belongs to."""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Give the enclosed work `seconds` to finish (None for no limit).
+
+    A nested deadline can shorten the one around it but never extend it.
+    """
+    current = _deadline.get()
+    if seconds is None:
+        new = current
+    else:
+        new = time.monotonic() + seconds
+        if current is not None:
+            new = min(new, current)
+    token = _deadline.set(new)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def with_deadline(seconds: Optional[float]):
+    """Decorator that runs each call of the wrapped function under deadline(seconds)."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with deadline(seconds):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def remaining() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there isn't one."""
+    current = _deadline.get()
+    if current is None:
+        return None
+    return max(0.0, current - time.monotonic())
+
+
+def expired() -> bool:
+    return remaining() == 0.0
+
+
+def check() -> None:
+    """Raise DeadlineExceeded if the current deadline has passed."""
+    if expired():
+        raise DeadlineExceeded("Deadline exceeded")
+
+
+def sleep(seconds: float) -> None:
+    """time.sleep that won't wait past the deadline.
+
+    Raises:
+        DeadlineExceeded: If the deadline would pass before the wait is over
+            (the wait is skipped rather than cut short).
+    """
+    left = remaining()
+    if left is not None and seconds >= left:
+        raise DeadlineExceeded(f"Deadline exceeded; not waiting {seconds:.0f} s with {left:.1f} s left")
+    time.sleep(seconds)
@@ -0,0 +1,115 @@
+import csv
+import io
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from deadlines import DeadlineExceeded
+from records import UserSummary
+from utils import dumps
+from walks import IncompleteWalk
+
+logger = logging.getLogger(__name__)
+
+EXPORT_COLUMNS = ('login', 'type', 'id', 'followers', 'following', 'first_seen')
+EXPORT_TYPES = ('followers', 'following', 'not_following_back', 'users_more_following')
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+# Fields requested from GitHub when exporting without a snapshot
+EXPORT_FIELDS = ('login', 'type', 'id', 'followers', 'following')
+# Last line of an export cut short after its first rows were sent, so it can't pass for a whole one
+CSV_INCOMPLETE_MARKER = '# incomplete export'
+
+
+def _first_seen(timestamp: Optional[float]) -> Optional[str]:
+    if timestamp is None:
+        return None
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).date().isoformat()
+
+
+def _export_row(user: UserSummary) -> Dict[str, Any]:
+    return {
+        'login': user.login,
+        'type': user.type,
+        'id': user.id,
+        'followers': user.followers,
+        'following': user.following,
+        'first_seen': _first_seen(user.first_seen),
+    }
+
+
+def _derived_rows(snapshot: Dict[str, Any], data_type: str) -> Iterator[UserSummary]:
+    """Rows of a derived view, taken from the list they came from so IDs and dates are included."""
+    source = snapshot['following'] if data_type == 'not_following_back' else snapshot['followers']
+    logins = {row.login.lower() for row in snapshot['views'][data_type]}
+    for user in source:
+        if user.login.lower() in logins:
+            yield user
+
+
+def _stream_rows(data_type: str) -> Iterator[Dict[str, Any]]:
+    from github_api import iter_connection_pages
+
+    logger.info(f"No snapshot yet; exporting {data_type} straight from GitHub")
+    for page in iter_connection_pages(data_type, EXPORT_FIELDS):
+        for user in page:
+            yield _export_row(user)
+
+
+def iter_export_rows(data_type: str) -> Iterator[Dict[str, Any]]:
+    """Return an iterator over the export rows of a list, one user at a time.
+
+    Rows come from the local snapshot when there is one. Without one, followers
+    and following are streamed straight from pagination (with no first_seen);
+    derived lists need both full lists, so a snapshot is taken first. The
+    snapshot is checked here, before any row is produced, so a caller can still
+    answer with an error.
+
+    Raises:
+        IncompleteWalk: Right away if the snapshot is partial. Streamed lists
+            raise it from the iterator, after the rows fetched so far; iter_csv
+            and iter_ndjson then end the output with a marker line.
+    """
+    import snapshot_store
+
+    snapshot = snapshot_store.get_stored_snapshot()
+    if not snapshot and data_type not in ('followers', 'following'):
+        snapshot = snapshot_store.get_snapshot()
+
+    if snapshot.get('partial'):
+        raise IncompleteWalk(f"Can't export {data_type}: the lists could only be fetched in part")
+    if snapshot:
+        users = snapshot[data_type] if data_type in ('followers', 'following') else _derived_rows(snapshot, data_type)
+        return (_export_row(user) for user in users)
+    return _stream_rows(data_type)
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Serialize rows as CSV, a header line first, one line at a time."""
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writeheader()
+    try:
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    except (IncompleteWalk, DeadlineExceeded) as e:
+        logger.error(f"Export cut short: {e}")
+        buffer.write(f"{CSV_INCOMPLETE_MARKER}: {e}\r\n")
+    # Header only, if there were no rows
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]]) -> Iterator[bytes]:
+    """Serialize rows as newline-delimited JSON."""
+    try:
+        for row in rows:
+            yield dumps(row) + b'\n'
+    except (IncompleteWalk, DeadlineExceeded) as e:
+        logger.error(f"Export cut short: {e}")
+        yield dumps({'error': str(e), 'incomplete': True}) + b'\n'
@@ -0,0 +1,188 @@
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+import numpy as np
+from decouple import config
+
+from utils import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+# Users followed by the daily tasks and whether they followed back
+FOLLOW_OUTCOMES_FILE = config('FOLLOW_OUTCOMES_FILE', default='follow_outcomes.json')
+# Days a followed user has to follow back before the follow counts as unanswered
+FOLLOW_BACK_WINDOW_DAYS = config('FOLLOW_BACK_WINDOW_DAYS', default=7, cast=int)
+# How many outcomes' worth of weight DEFAULT_WEIGHTS carry in the fit, so the
+# first few outcomes nudge the ranking rather than swing it
+FOLLOW_PRIOR_STRENGTH = config('FOLLOW_PRIOR_STRENGTH', default=30, cast=float)
+# Oldest outcomes are dropped beyond this many
+MAX_OUTCOMES = config('MAX_OUTCOMES', default=5000, cast=int)
+
+FEATURES = ('bias', 'log_followers', 'log_following', 'log_ratio', 'log_public_repos', 'is_user')
+# Starting point before any outcomes are recorded: people who follow more than
+# follow them, with a modest audience, are the likeliest to follow back
+DEFAULT_WEIGHTS = (-1.0, -0.3, 0.2, 0.8, 0.1, 1.0)
+
+# Gradient descent settings for the logistic fit
+_FIT_ITERATIONS = 300
+_LEARNING_RATE = 0.5
+
+_lock = threading.Lock()
+# Weights fitted to the outcomes file as of `mtime`
+_fitted: Dict[str, Any] = {'mtime': None, 'weights': None, 'outcomes': 0}
+
+
+def _raw_features(user) -> Dict[str, Any]:
+    """The fetched fields the features are derived from, as stored with each outcome."""
+    return {
+        'followers': user.followers or 0,
+        'following': user.following or 0,
+        'public_repos': getattr(user, 'public_repos', None) or 0,
+        'type': user.type,
+    }
+
+
+def _feature_matrix(raws: Sequence[Dict[str, Any]]):
+    """Features for many users at once: one row per user, columns as in FEATURES."""
+    counts = np.array([(raw['followers'], raw['following'], raw['public_repos']) for raw in raws],
+                      dtype=float).reshape(-1, 3)
+    is_user = np.array([raw['type'] == 'User' for raw in raws], dtype=float)
+    followers, following, repos = counts.T
+    return np.column_stack([
+        np.ones(len(raws)),
+        np.log1p(followers),
+        np.log1p(following),
+        np.log((following + 1) / (followers + 1)),
+        np.log1p(repos),
+        is_user,
+    ])
+
+
+def _sigmoid(values):
+    return 1.0 / (1.0 + np.exp(-np.clip(values, -30, 30)))
+
+
+def _fit(matrix, labels):
+    """Logistic regression pulled towards DEFAULT_WEIGHTS as if they were FOLLOW_PRIOR_STRENGTH outcomes."""
+    prior = np.array(DEFAULT_WEIGHTS)
+    weights = prior.copy()
+    total = len(labels) + FOLLOW_PRIOR_STRENGTH
+    for _ in range(_FIT_ITERATIONS):
+        predictions = _sigmoid(matrix @ weights)
+        gradient = (matrix.T @ (predictions - labels) + FOLLOW_PRIOR_STRENGTH * (weights - prior)) / total
+        weights -= _LEARNING_RATE * gradient
+    return weights
+
+
+def _outcomes_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(FOLLOW_OUTCOMES_FILE)
+    except OSError:
+        return None
+
+
+def _weights():
+    """Weights fitted to the resolved outcomes (DEFAULT_WEIGHTS until there are any)."""
+    mtime = _outcomes_mtime()
+    with _lock:
+        if _fitted['weights'] is not None and _fitted['mtime'] == mtime:
+            return _fitted['weights']
+
+    resolved = [outcome for outcome in load_json_file(FOLLOW_OUTCOMES_FILE).values()
+                if outcome.get('followed_back') is not None]
+    if resolved:
+        labels = np.array([outcome['followed_back'] for outcome in resolved], dtype=float)
+        weights = _fit(_feature_matrix([outcome['features'] for outcome in resolved]), labels)
+        logger.info(f"Fitted follow-back weights to {len(resolved)} outcomes: "
+                    f"{dict(zip(FEATURES, weights.round(3).tolist()))}")
+    else:
+        weights = np.array(DEFAULT_WEIGHTS)
+
+    with _lock:
+        _fitted.update(mtime=mtime, weights=weights, outcomes=len(resolved))
+    return weights
+
+
+def score_users(users: Sequence[Any]) -> List[float]:
+    """Estimate how likely each user is to follow back, between 0 and 1.
+
+    `users` are records with followers, following and type (public_repos is used
+    when present). The whole pool is scored in one matrix product.
+    """
+    if not users:
+        return []
+    return _sigmoid(_feature_matrix([_raw_features(user) for user in users]) @ _weights()).tolist()
+
+
+def rank_users(users: Sequence[Any]) -> List[Any]:
+    """Return users ordered from the likeliest to follow back to the least likely."""
+    scores = score_users(users)
+    order = sorted(range(len(users)), key=scores.__getitem__, reverse=True)
+    return [users[index] for index in order]
+
+
+def record_follows(users: Iterable[Any], now: Optional[float] = None) -> None:
+    """Remember users we just followed, with the features they were scored on."""
+    now = time.time() if now is None else now
+    with _lock:
+        outcomes = load_json_file(FOLLOW_OUTCOMES_FILE)
+        for user in users:
+            outcomes[user.login.lower()] = {
+                'login': user.login,
+                'followed_at': now,
+                'features': _raw_features(user),
+                'followed_back': None,
+            }
+        if len(outcomes) > MAX_OUTCOMES:
+            oldest_first = sorted(outcomes, key=lambda key: outcomes[key]['followed_at'])
+            for key in oldest_first[:len(outcomes) - MAX_OUTCOMES]:
+                del outcomes[key]
+        save_json_file(FOLLOW_OUTCOMES_FILE, outcomes)
+
+
+def resolve_outcomes(follower_logins: Set[str], checked_at: float) -> Dict[str, int]:
+    """Settle pending outcomes against a follower list.
+
+    Args:
+        follower_logins: Lowercased logins of our followers.
+        checked_at: When that list was taken. Users still not in it
+            FOLLOW_BACK_WINDOW_DAYS after we followed them count as not following back.
+
+    Returns:
+        How many outcomes were settled each way.
+    """
+    window = FOLLOW_BACK_WINDOW_DAYS * 24 * 60 * 60
+    settled = {'followed_back': 0, 'ignored': 0}
+    with _lock:
+        outcomes = load_json_file(FOLLOW_OUTCOMES_FILE)
+        for key, outcome in outcomes.items():
+            if outcome.get('followed_back') is not None or checked_at < outcome['followed_at']:
+                continue
+            if key in follower_logins:
+                outcome.update(followed_back=True, resolved_at=checked_at)
+                settled['followed_back'] += 1
+            elif checked_at - outcome['followed_at'] > window:
+                outcome.update(followed_back=False, resolved_at=checked_at)
+                settled['ignored'] += 1
+        if settled['followed_back'] or settled['ignored']:
+            save_json_file(FOLLOW_OUTCOMES_FILE, outcomes)
+    return settled
+
+
+def get_stats() -> Dict[str, Any]:
+    """Outcome counts, the follow-back rate and the weights currently in use."""
+    outcomes = load_json_file(FOLLOW_OUTCOMES_FILE).values()
+    resolved = [outcome for outcome in outcomes if outcome.get('followed_back') is not None]
+    followed_back = sum(1 for outcome in resolved if outcome['followed_back'])
+    weights = _weights()
+    return {
+        'outcomes': len(outcomes),
+        'pending': len(outcomes) - len(resolved),
+        'followed_back': followed_back,
+        'follow_back_rate': round(followed_back / len(resolved), 3) if resolved else None,
+        'fitted': bool(resolved),
+        'weights': dict(zip(FEATURES, [round(float(weight), 3) for weight in weights])),
+    }
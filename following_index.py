@@ -0,0 +1,184 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Set
+
+from decouple import config
+
+from utils import file_lock, load_json_file, save_json_file
+from walks import IncompleteWalk
+
+logger = logging.getLogger(__name__)
+
+FOLLOWING_INDEX_FILE = config('FOLLOWING_INDEX_FILE', default='following_index.json')
+# How long unfollows are remembered (seconds), so a reconcile whose walk started
+# before one doesn't bring the user back; longer than any walk takes
+_UNFOLLOW_MEMORY = 24 * 60 * 60
+
+# Local copy of who we follow, keyed by lowercased login:
+#   {'login': ..., 'id': ..., 'type': ..., 'added_at': time recorded by record_followed}
+# plus recent unfollows, {login: time}. Kept up to date by follow/unfollow calls and
+# reconciled with GitHub on a schedule, so candidate filtering never has to page
+# through the whole following list. Web workers and the scheduler process share the
+# file: each reloads it when it changes and changes it under a file lock.
+_lock = threading.RLock()
+_entries: Optional[Dict[str, Dict[str, Any]]] = None
+_removed: Dict[str, float] = {}
+_synced_at: Optional[float] = None
+# Modification time of FOLLOWING_INDEX_FILE when it was last read or written by this process
+_file_mtime_seen: Optional[float] = None
+
+
+def _file_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(FOLLOWING_INDEX_FILE)
+    except OSError:
+        return None
+
+
+def _ensure_loaded() -> None:
+    global _entries, _removed, _synced_at, _file_mtime_seen
+
+    mtime = _file_mtime()
+    if _entries is not None and mtime == _file_mtime_seen:
+        return
+    data = load_json_file(FOLLOWING_INDEX_FILE)
+    _entries = data.get('users', {})
+    _removed = data.get('removed', {})
+    _synced_at = data.get('synced_at')
+    _file_mtime_seen = mtime
+    logger.debug(f"Loaded following index with {len(_entries)} entries")
+
+
+def _save() -> None:
+    global _file_mtime_seen
+
+    save_json_file(FOLLOWING_INDEX_FILE, {'synced_at': _synced_at, 'users': _entries, 'removed': _removed})
+    _file_mtime_seen = _file_mtime()
+
+
+@contextmanager
+def _updating():
+    """Hold the index, freshly read from disk, for a change that is then saved.
+
+    The file lock keeps another process from saving in between, which would
+    lose one of the two changes.
+    """
+    with _lock, file_lock(FOLLOWING_INDEX_FILE):
+        _ensure_loaded()
+        yield
+
+
+def is_synced() -> bool:
+    """True once the index has been reconciled with GitHub at least once."""
+    with _lock:
+        _ensure_loaded()
+        return _synced_at is not None
+
+
+def get_following_logins() -> Set[str]:
+    """Return the lowercased logins we follow.
+
+    If the index has never been reconciled, a full walk is done first (and
+    tried once more, resuming from its checkpoint, if it stops part way); after
+    that this is a pure in-memory lookup.
+
+    Raises:
+        IncompleteWalk: If the index has never been built from a complete walk
+            and there is no stored snapshot to fall back on. An index built from
+            part of the list would let users we already follow through.
+    """
+    with _lock:
+        _ensure_loaded()
+        if _synced_at is None:
+            reconcile()
+        if _synced_at is None:
+            # The second walk resumes from the first one's checkpoint
+            reconcile()
+        if _synced_at is not None:
+            return set(_entries)
+
+        # Snapshots are only stored from complete walks, so the last one is a sound, if older, list
+        import snapshot_store
+
+        following = snapshot_store.get_stored_snapshot().get('following')
+        if not following:
+            raise IncompleteWalk("The following list could not be fetched in full and no snapshot is stored")
+        logger.warning(f"Using the stored snapshot's following list ({len(following)} users) until the index "
+                       f"can be built")
+        return set(_entries) | {user.login.lower() for user in following}
+
+
+def record_followed(login: str, owner_id: Optional[str] = None, owner_type: Optional[str] = None) -> None:
+    """Add a user we just followed."""
+    with _updating():
+        _entries[login.lower()] = {'login': login, 'id': owner_id, 'type': owner_type, 'added_at': time.time()}
+        _removed.pop(login.lower(), None)
+        _save()
+
+
+def record_unfollowed(login: str) -> None:
+    """Remove a user we just unfollowed."""
+    with _updating():
+        _entries.pop(login.lower(), None)
+        # Remembered even if the index didn't have them, in case a reconcile walk is under way
+        _removed[login.lower()] = time.time()
+        _save()
+
+
+def reconcile(following: Optional[Iterable[Dict[str, Any]]] = None,
+              walk_started_at: Optional[float] = None) -> Dict[str, int]:
+    """Replace the index with GitHub's current following list.
+
+    An incomplete list (a WalkResult that stopped part way) is never used;
+    the index is left as it was. Follows and unfollows recorded after the walk
+    started, in any process, are kept: the walk may have missed them.
+
+    Args:
+        following: An already-fetched following list (FollowingEdge records).
+            When omitted, the list is fetched with github_api.get_following().
+        walk_started_at: When the walk behind `following` started (now by default).
+
+    Returns:
+        Counts of entries added and removed by the reconciliation.
+    """
+    global _entries, _removed, _synced_at
+
+    if following is None:
+        walk_started_at = time.time()
+        from github_api import get_following, UNFOLLOW_FIELDS
+        following = get_following(fields=UNFOLLOW_FIELDS)
+    if not getattr(following, 'complete', True):
+        logger.warning(f"Following walk is incomplete ({len(following)} fetched); keeping the existing index")
+        return {'added': 0, 'removed': 0}
+
+    fresh = {
+        user.login.lower(): {'login': user.login, 'id': user.id, 'type': user.type}
+        for user in following
+    }
+
+    if walk_started_at is None:
+        walk_started_at = time.time()
+
+    with _updating():
+        if not fresh and _entries:
+            logger.warning("Following walk returned no users; keeping the existing index")
+            return {'added': 0, 'removed': 0}
+        for key, entry in _entries.items():
+            if entry.get('added_at', 0) >= walk_started_at:
+                fresh.setdefault(key, entry)
+        for key, removed_at in _removed.items():
+            if removed_at >= walk_started_at:
+                fresh.pop(key, None)
+        added = len(fresh.keys() - _entries.keys())
+        removed = len(_entries.keys() - fresh.keys())
+        now = time.time()
+        _entries = fresh
+        _removed = {key: removed_at for key, removed_at in _removed.items() if now - removed_at < _UNFOLLOW_MEMORY}
+        _synced_at = now
+        _save()
+
+    logger.info(f"Reconciled following index: {len(fresh)} users ({added} added, {removed} removed)")
+    return {'added': added, 'removed': removed}
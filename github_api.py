@@ -2,8 +2,23 @@ import requests
 import logging
 import time
 import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from decouple import config
-from utils import chunks, load_cache, save_cache
+import deadlines
+from deadlines import DeadlineExceeded
+import follow_scoring
+from utils import chunks, load_cache, save_cache, submit_with_context
+from tracing import span, traced, record_slow_query
+from token_pool import TokenPool, parse_tokens
+from mutation_pacer import DEFAULT_SECONDARY_LIMIT_WAIT, MutationPacer
+from transport import install_transport
+from queries import connection_page_query, login_variables, normalize_fields, users_by_login_query
+from records import FollowingEdge, UserProfile, UserSummary
+import walks
+from walks import IncompleteWalk, WalkResult
+import following_index
+import snapshot_store
 from functools import lru_cache
 import concurrent.futures
 
@@ -11,6 +26,10 @@ logger = logging.getLogger(__name__)
 
 GITHUB_TOKEN = config('GITHUB_TOKEN')
 GITHUB_USERNAME = config('GITHUB_USERNAME')
+# Extra tokens (comma-separated) used only for read-only queries that don't depend on the viewer
+GITHUB_READ_TOKENS = parse_tokens(config('GITHUB_READ_TOKENS', default=''))
+# Points of the owner token's budget kept back from reads for follow/unfollow mutations
+OWNER_TOKEN_RESERVE = config('OWNER_TOKEN_RESERVE', default=500, cast=int)
 
 # Use a session for connection pooling and improved performance
 session = requests.Session()
@@ -19,11 +38,38 @@ session.headers.update({
     'Content-Type': 'application/json',
     'Accept': 'application/vnd.github.v3+json'  # Explicitly requesting v3 API
 })
+# Seconds to wait for a connection and for each read; a stalled request fails instead
+# of holding a worker forever. Both are cut down to the time left before a deadline.
+GITHUB_CONNECT_TIMEOUT = config('GITHUB_CONNECT_TIMEOUT', default=5, cast=float)
+GITHUB_READ_TIMEOUT = config('GITHUB_READ_TIMEOUT', default=30, cast=float)
+# Optionally record or replay all GitHub traffic (GITHUB_TRANSPORT=record|replay)
+install_transport(session, secrets=[GITHUB_TOKEN] + GITHUB_READ_TOKENS)
+
+token_pool = TokenPool([GITHUB_TOKEN] + GITHUB_READ_TOKENS,
+                       owner_reserve=OWNER_TOKEN_RESERVE if GITHUB_READ_TOKENS else 0)
+
+# Ceiling on follow/unfollow mutations per minute across all threads (0 = no limit).
+# GitHub's secondary limits punish bursts of content-creating requests.
+MUTATIONS_PER_MINUTE = config('MUTATIONS_PER_MINUTE', default=60, cast=int)
+mutation_pacer = MutationPacer(MUTATIONS_PER_MINUTE)
 
 # API rate limit management
 RATE_LIMIT_THRESHOLD = 100  # Minimum remaining requests before slowing down
 MIN_REQUEST_INTERVAL = 0.1  # Minimum time between requests in seconds
 
+# Field sets (see queries.USER_FIELDS) for each kind of lookup, so every caller asks
+# GitHub only for what it uses
+FOLLOWER_COUNT_FIELDS = ('login', 'type', 'id', 'followers', 'following')
+FOLLOWING_FIELDS = ('login', 'type', 'id', 'followers', 'following')
+# What unfollowing needs: the node ID and whether it's a user or an organization
+UNFOLLOW_FIELDS = ('login', 'type', 'id')
+PROFILE_FIELDS = ('login', 'type', 'followers', 'following', 'bio', 'public_repos')
+# What the dashboard user cards render
+CARD_FIELDS = ('login', 'type', 'followers', 'following')
+# Card fields plus what follow_scoring ranks suggestions on
+SUGGESTION_FIELDS = ('login', 'type', 'followers', 'following', 'public_repos')
+FOLLOWS_VIEWER_FIELDS = ('login', 'follows_viewer')
+
 # Use a lock for thread-safe throttling
 import threading
 _throttle_lock = threading.Lock()
@@ -33,78 +79,180 @@ def throttle_requests():
     """Throttle requests to avoid hitting rate limits in a thread-safe manner."""
     global _last_request_time
 
-    with _throttle_lock:
-        current_time = time.time()
-        elapsed_time = current_time - _last_request_time
-
-        # If we've made a request recently, wait a bit
-        if elapsed_time < MIN_REQUEST_INTERVAL:
-            sleep_time = MIN_REQUEST_INTERVAL - elapsed_time
-            time.sleep(sleep_time)
-
-        # Update the last request time after potentially sleeping
-        _last_request_time = time.time()
-
-def execute_github_graphql_query(query, variables=None, retry_count=3):
-    """Execute a GraphQL query with automatic retries and error handling."""
+    with span('throttle.wait') as throttle_span:
+        with _throttle_lock:
+            current_time = time.time()
+            elapsed_time = current_time - _last_request_time
+
+            # If we've made a request recently, wait a bit
+            sleep_time = 0
+            if elapsed_time < MIN_REQUEST_INTERVAL:
+                sleep_time = MIN_REQUEST_INTERVAL - elapsed_time
+                time.sleep(sleep_time)
+
+            # Update the last request time after potentially sleeping
+            _last_request_time = time.time()
+        throttle_span.set_attribute('slept_ms', round(sleep_time * 1000, 2))
+
+def _request_timeout():
+    """(connect, read) timeouts for the next request, capped by the current deadline."""
+    deadlines.check()
+    left = deadlines.remaining()
+    if left is None:
+        return GITHUB_CONNECT_TIMEOUT, GITHUB_READ_TIMEOUT
+    return min(GITHUB_CONNECT_TIMEOUT, left), min(GITHUB_READ_TIMEOUT, left)
+
+def _retry_after_seconds(value):
+    """Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date."""
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        logger.warning(f"Unreadable Retry-After header {value!r}; waiting {DEFAULT_SECONDARY_LIMIT_WAIT}s")
+        return DEFAULT_SECONDARY_LIMIT_WAIT
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+def _describe_query(query):
+    """Return a short single-line description of a GraphQL document for traces."""
+    return ' '.join(query.split())[:120]
+
+def execute_github_graphql_query(query, variables=None, retry_count=3, read_only=False,
+                                 allow_partial=False):
+    """Execute a GraphQL query with automatic retries and error handling.
+
+    Read-only queries that don't depend on the viewer may pass read_only=True to be
+    sent with whichever pooled token has the most budget left. Everything else,
+    including all mutations, uses the owner token.
+
+    With allow_partial=True, a response carrying both data and non-rate-limit
+    errors (e.g. one unknown login among many aliases) is returned instead of raised.
+    """
     url = 'https://api.github.com/graphql'
     payload = {'query': query, 'variables': variables or {}}
 
     # Skip rate limit check for rate limit query itself to avoid recursion
     is_rate_limit_query = 'rateLimit' in query and 'cost' in query and 'remaining' in query
+    is_mutation = query.lstrip().startswith('mutation')
+
+    description = _describe_query(query)
 
     for attempt in range(retry_count):
+        deadlines.check()
         try:
-            # Check rate limits before making request, but only if this isn't the rate limit query itself
-            if attempt == 0 and not is_rate_limit_query and not check_rate_limit(quiet=True):
-                logger.warning("Approaching rate limit, slowing down requests")
-                time.sleep(5)  # Wait longer if we're close to the rate limit
-
-            throttle_requests()
-
-            logger.debug(f"Executing GraphQL query (attempt {attempt+1}/{retry_count})")
-            response = session.post(url, json=payload)
-
-            if response.status_code == 403:
-                logger.error('403 Forbidden: Check your token permissions and rate limits.')
-                # Check if we hit rate limit
-                if 'rate limit' in response.text.lower():
-                    reset_time = int(response.headers.get('X-RateLimit-Reset', 0)) - time.time()
-                    if reset_time > 0:
-                        logger.warning(f"Rate limit exceeded. Waiting {reset_time:.0f} seconds")
-                        time.sleep(min(reset_time + 1, 60))  # Wait up to 60 seconds
-                        continue
-                raise Exception('403 Forbidden: Check your token permissions and rate limits.')
-
-            response.raise_for_status()
-            result = response.json()
-
-            if 'errors' in result:
-                error_messages = '; '.join([error['message'] for error in result['errors']])
-                logger.error(f"GraphQL query failed: {error_messages}")
-
-                # Check for rate limit errors
-                if any('rate limit' in error['message'].lower() for error in result['errors']):
-                    logger.warning("Rate limit error detected, waiting before retry")
-                    time.sleep(10)
-                    continue
-
-                raise Exception(f"GraphQL query failed: {error_messages}")
-
-            logger.debug("GraphQL query executed successfully")
-            return result
+            if is_mutation:
+                with span('mutation.pace') as pace_span:
+                    pace_span.set_attribute('waited_ms', round(mutation_pacer.acquire() * 1000, 2))
+            token_state = token_pool.acquire() if read_only else token_pool.acquire_owner()
+            with span('graphql.attempt', attempt=attempt + 1, query=description,
+                      token=token_state.label) as attempt_span:
+                result = _execute_graphql_attempt(url, payload, attempt, retry_count,
+                                                  is_rate_limit_query, attempt_span,
+                                                  token_state, read_only, allow_partial, is_mutation)
+            record_slow_query(description, attempt_span.duration_ms, attempt=attempt + 1,
+                              variables=variables or {})
+            if result is not None:
+                return result
 
         except requests.exceptions.RequestException as e:
             logger.error(f'Request error (attempt {attempt+1}/{retry_count}): {e}')
+            # A timeout cut short by the deadline is reported as the deadline, not a network error
+            deadlines.check()
             if attempt < retry_count - 1:
                 wait_time = 2 ** attempt  # Exponential backoff
                 logger.info(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
+                with span('retry.backoff', wait_s=wait_time):
+                    deadlines.sleep(wait_time)
             else:
                 raise
 
     raise Exception(f"Failed after {retry_count} attempts")
 
+def _execute_graphql_attempt(url, payload, attempt, retry_count, is_rate_limit_query,
+                             attempt_span, token_state, read_only=False, allow_partial=False,
+                             is_mutation=False):
+    """Run a single GraphQL attempt.
+
+    Returns the parsed result, or None when the caller should retry.
+    """
+    # Check rate limits before making request, but only if this isn't the rate limit query itself.
+    # Pooled tokens are tracked from response headers; the owner token is checked directly.
+    if token_state is token_pool.owner:
+        approaching_limit = attempt == 0 and not is_rate_limit_query and not check_rate_limit(quiet=True)
+    else:
+        approaching_limit = token_state.headroom(time.time()) < RATE_LIMIT_THRESHOLD
+    if approaching_limit:
+        logger.warning("Approaching rate limit, slowing down requests")
+        with span('rate_limit.wait', wait_s=5):
+            deadlines.sleep(5)  # Wait longer if we're close to the rate limit
+
+    throttle_requests()
+
+    logger.debug(f"Executing GraphQL query (attempt {attempt+1}/{retry_count})")
+    response = session.post(url, json=payload, headers=token_state.auth_header, timeout=_request_timeout())
+    token_pool.update(token_state, response.headers)
+    attempt_span.set_attribute('status', response.status_code)
+
+    if response.status_code == 403:
+        logger.error('403 Forbidden: Check your token permissions and rate limits.')
+        # Secondary (burst) limits say how long to back off in Retry-After
+        retry_after = response.headers.get('Retry-After')
+        if retry_after is not None or 'secondary rate limit' in response.text.lower():
+            wait_time = (_retry_after_seconds(retry_after) if retry_after is not None
+                         else DEFAULT_SECONDARY_LIMIT_WAIT)
+            if is_mutation:
+                # The pacer holds back every thread's next mutation, including this retry
+                mutation_pacer.record_secondary_limit(wait_time)
+            else:
+                logger.warning(f"Secondary rate limit hit. Waiting {wait_time:.0f} seconds")
+                with span('rate_limit.wait', wait_s=wait_time, secondary=True):
+                    deadlines.sleep(wait_time)
+            return None
+        # Check if we hit rate limit
+        if 'rate limit' in response.text.lower():
+            # Another pooled token may still have budget; retry on it straight away
+            if read_only and token_pool.best_headroom() > RATE_LIMIT_THRESHOLD:
+                logger.warning(f"Token {token_state.label} is rate limited; retrying with another token")
+                return None
+            reset_time = int(response.headers.get('X-RateLimit-Reset', 0)) - time.time()
+            if reset_time > 0:
+                logger.warning(f"Rate limit exceeded. Waiting {reset_time:.0f} seconds")
+                with span('rate_limit.wait', wait_s=round(min(reset_time + 1, 60), 1)):
+                    deadlines.sleep(min(reset_time + 1, 60))  # Wait up to 60 seconds
+                return None
+        raise Exception('403 Forbidden: Check your token permissions and rate limits.')
+
+    response.raise_for_status()
+    result = response.json()
+
+    if 'errors' in result:
+        error_messages = '; '.join([error['message'] for error in result['errors']])
+        rate_limited = any('rate limit' in error['message'].lower() for error in result['errors'])
+
+        if allow_partial and result.get('data') and not rate_limited:
+            logger.warning(f"Returning partial GraphQL result: {error_messages}")
+            return result
+
+        logger.error(f"GraphQL query failed: {error_messages}")
+
+        # Check for rate limit errors
+        if rate_limited:
+            logger.warning("Rate limit error detected, waiting before retry")
+            with span('rate_limit.wait', wait_s=10):
+                deadlines.sleep(10)
+            return None
+
+        raise Exception(f"GraphQL query failed: {error_messages}")
+
+    if is_mutation:
+        mutation_pacer.record_success()
+    logger.debug("GraphQL query executed successfully")
+    return result
+
 # Cache for rate limit status
 _rate_limit_cache = {
     'data': None,
@@ -119,7 +267,10 @@ def get_rate_limit_status():
 
     current_time = time.time()
     # If cache is valid, return cached data
-    if _rate_limit_cache['data'] and (current_time - _rate_limit_cache['timestamp'] < RATE_LIMIT_CACHE_TTL):
+    with span('cache.lookup', key='rate_limit') as cache_span:
+        hit = bool(_rate_limit_cache['data']) and (current_time - _rate_limit_cache['timestamp'] < RATE_LIMIT_CACHE_TTL)
+        cache_span.set_attribute('hit', hit)
+    if hit:
         return _rate_limit_cache['data']
 
     # Cache expired or not set, fetch new data
@@ -161,8 +312,22 @@ def check_rate_limit(quiet=False):
         logger.error(f"Error checking rate limit: {e}")
         return True  # Default to true to allow operations to continue
 
+def get_token_pool_status():
+    """Return the per-token rate-limit budget as tracked from response headers."""
+    return token_pool.status()
+
+def get_owner_budget():
+    """Points the owner token has left this hour, as tracked from response headers."""
+    owner = token_pool.owner
+    return owner.headroom(time.time()) + owner.reserve
+
+def get_mutation_pacer_status():
+    """Return the mutation pacer's rate, throughput and back-off counters."""
+    return mutation_pacer.status()
+
+@traced('suggest.random_users')
 def get_random_users(limit=50, batch_size=100):
-    """Fetch random GitHub users efficiently."""
+    """Fetch random GitHub users, best follow-back prospects first (see follow_scoring)."""
     logger.info(f"Fetching {limit} random users")
     accumulated_users = []
     since = random.randint(1, 10000000)  # Random starting point for more variety
@@ -172,9 +337,13 @@ def get_random_users(limit=50, batch_size=100):
         while len(accumulated_users) < 2000:
             throttle_requests()
 
+            token_state = token_pool.acquire()
             response = session.get(
                 f'https://api.github.com/users?per_page={batch_size}&since={since}',
+                headers=token_state.auth_header,
+                timeout=_request_timeout(),
             )
+            token_pool.update(token_state, response.headers)
 
             if response.status_code == 403:
                 logger.error('403 Forbidden: Check your token permissions and rate limits.')
@@ -194,39 +363,33 @@ def get_random_users(limit=50, batch_size=100):
 
             time.sleep(MIN_REQUEST_INTERVAL)  # Respect rate limits
 
-        # Get users we're already following
-        following = get_following()
-        following_usernames = set(user['login'] for user in following)
+        # Get users we're already following from the local index
+        following_usernames = following_index.get_following_logins()
 
         # Filter out users we're already following
-        filtered_users = [user for user in accumulated_users if user['login'] not in following_usernames]
+        filtered_users = [user for user in accumulated_users if user['login'].lower() not in following_usernames]
 
         # Fetch user details in parallel
         usernames = [user['login'] for user in filtered_users[:min(300, len(filtered_users))]]
-        users_info = get_users_info_parallel(usernames)
+        users_info = get_users_info_parallel(usernames, fields=SUGGESTION_FIELDS)
 
         # Filter out organizations and select users with reasonable follower counts
         users_info = [
             user for user in users_info
-            if user.get('__typename') == 'User' and
-               user.get('followers', 0) >= 5 and  # Users with at least 5 followers
-               user.get('following', 0) >= 10     # Users who follow at least 10 people
+            if user.type == 'User' and
+               user.followers >= 5 and  # Users with at least 5 followers
+               user.following >= 10     # Users who follow at least 10 people
         ]
 
-        # Select random subset with preference to active users
-        if users_info:
-            # Sort by activity (more following = more active)
-            users_info.sort(key=lambda x: x.get('following', 0), reverse=True)
-            # Take top 50% and randomly sample from them
-            top_half = users_info[:max(len(users_info) // 2, limit)]
-            random_users = random.sample(top_half, min(limit, len(top_half)))
-            return random_users
-        return []
     except Exception as e:
         logger.error(f'Error fetching random users: {e}')
         return []
 
-def get_users_info_parallel(usernames, max_workers=5):
+    # Outside the try: a fault in the ranking itself must surface, not look like an empty pool.
+    # Keep the users likeliest to follow back; the random starting ID already varies the pool.
+    return follow_scoring.rank_users(users_info)[:limit]
+
+def get_users_info_parallel(usernames, max_workers=5, fields=PROFILE_FIELDS):
     """Fetch user info for multiple usernames in parallel."""
     logger.info(f"Fetching info for {len(usernames)} users in parallel")
 
@@ -238,8 +401,9 @@ def get_users_info_parallel(usernames, max_workers=5):
     users_info = []
 
     # Process chunks in parallel
-    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(get_users_info_chunk, chunk) for chunk in username_chunks]
+    with span('enrich.users', users=len(usernames), chunks=len(username_chunks)), \
+            concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [submit_with_context(executor, get_users_info_chunk, chunk, fields) for chunk in username_chunks]
 
         for future in concurrent.futures.as_completed(futures):
             try:
@@ -251,61 +415,31 @@ def get_users_info_parallel(usernames, max_workers=5):
     logger.info(f"Successfully fetched info for {len(users_info)} users")
     return users_info
 
-def get_users_info_chunk(usernames):
-    """Fetch info for a chunk of usernames."""
+def get_users_info_chunk(usernames, fields=PROFILE_FIELDS):
+    """Fetch the requested fields for a chunk of usernames."""
     if not usernames:
         return []
 
     try:
-        query_fragments = []
-        for index, username in enumerate(usernames):
-            query_fragments.append(f'''
-                user_{index}: user(login: "{username}") {{
-                    login
-                    __typename
-                    followers {{
-                        totalCount
-                    }}
-                    following {{
-                        totalCount
-                    }}
-                    bio
-                    repositories(privacy: PUBLIC) {{
-                        totalCount
-                    }}
-                }}
-            ''')
-
-        query = f'''
-        query {{
-            {"".join(query_fragments)}
-        }}
-        '''
-
-        result = execute_github_graphql_query(query)
+        fields = normalize_fields(fields)
+        query = users_by_login_query(len(usernames), fields)
+        result = execute_github_graphql_query(query, login_variables(usernames), read_only=True)
         data = result.get('data', {})
         users_info = []
 
         for key in data:
             user_data = data[key]
             if user_data:
-                users_info.append({
-                    'login': user_data['login'],
-                    'followers': user_data['followers']['totalCount'],
-                    'following': user_data['following']['totalCount'],
-                    'bio': user_data.get('bio', ''),
-                    'public_repos': user_data['repositories']['totalCount'],
-                    '__typename': user_data['__typename'],
-                })
+                users_info.append(UserProfile.from_node(user_data, fields))
 
         return users_info
     except Exception as e:
         logger.error(f'Error fetching user info chunk: {e}')
         return []
 
-def get_users_info(usernames):
+def get_users_info(usernames, fields=PROFILE_FIELDS):
     """Backwards compatibility wrapper for get_users_info_parallel."""
-    return get_users_info_parallel(usernames)
+    return get_users_info_parallel(usernames, fields=fields)
 
 def follow_user(username):
     """Follow a GitHub user."""
@@ -333,6 +467,8 @@ def follow_user(username):
     try:
         execute_github_graphql_query(mutation, variables)
         logger.info(f"Successfully followed {username}")
+        following_index.record_followed(username, owner_id, owner_type)
+        snapshot_store.mark_stale()
         return True, ''
     except Exception as e:
         logger.error(f'Error following {username}: {e}')
@@ -347,6 +483,10 @@ def unfollow_user(username):
         logger.error(f"User not found: {username}")
         return False, 'User not found'
 
+    return unfollow_owner(username, owner_id, owner_type)
+
+def unfollow_owner(username, owner_id, owner_type):
+    """Unfollow a user or organization whose node ID and type are already known."""
     if owner_type == 'User':
         mutation = '''
         mutation ($userId: ID!) {
@@ -372,6 +512,8 @@ def unfollow_user(username):
     try:
         execute_github_graphql_query(mutation, variables)
         logger.info(f"Successfully unfollowed {username}")
+        following_index.record_unfollowed(username)
+        snapshot_store.apply_unfollow(username)
         return True, ''
     except Exception as e:
         logger.error(f'Error unfollowing {username}: {e}')
@@ -386,19 +528,18 @@ def bulk_follow_users(usernames, max_workers=3):
         return results
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_username = {executor.submit(follow_user, username): username for username in usernames}
+        future_to_username = {submit_with_context(executor, follow_user, username): username for username in usernames}
 
         for future in concurrent.futures.as_completed(future_to_username):
             username = future_to_username[future]
             try:
                 success, message = future.result()
                 results[username] = {'success': success, 'message': message}
-                # Small delay to prevent overwhelming the API
-                time.sleep(0.5)
             except Exception as e:
                 logger.error(f'Error in bulk follow for {username}: {e}')
                 results[username] = {'success': False, 'message': str(e)}
 
+    logger.info(f"Mutation throughput: {mutation_pacer.status()}")
     return results
 
 def bulk_unfollow_users(usernames, max_workers=3):
@@ -410,28 +551,71 @@ def bulk_unfollow_users(usernames, max_workers=3):
         return results
 
     with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_username = {executor.submit(unfollow_user, username): username for username in usernames}
+        future_to_username = {submit_with_context(executor, unfollow_user, username): username for username in usernames}
 
         for future in concurrent.futures.as_completed(future_to_username):
             username = future_to_username[future]
             try:
                 success, message = future.result()
                 results[username] = {'success': success, 'message': message}
-                # Small delay to prevent overwhelming the API
-                time.sleep(0.5)
             except Exception as e:
                 logger.error(f'Error in bulk unfollow for {username}: {e}')
                 results[username] = {'success': False, 'message': str(e)}
 
+    logger.info(f"Mutation throughput: {mutation_pacer.status()}")
     return results
 
+def bulk_unfollow_owners(users, max_workers=3, max_pending=None, max_failures=10):
+    """Unfollow users from an iterable while it is still being produced.
+
+    `users` yields FollowingEdge records (e.g. filtered following pages),
+    so no owner-ID lookups are needed. At most `max_pending` unfollows are queued
+    at once, which keeps the producer from running far ahead of the workers.
+
+    Returns:
+        A summary dict: counts of users unfollowed and failed, and a {login: message}
+        dict of the first `max_failures` failures.
+    """
+    max_pending = max_pending or max_workers * 2
+    slots = threading.BoundedSemaphore(max_pending)
+    summary_lock = threading.Lock()
+    summary = {'unfollowed': 0, 'failed': 0, 'failures': {}}
+
+    def unfollow(user):
+        try:
+            success, message = unfollow_owner(user.login, user.id, user.type)
+        except Exception as e:
+            logger.error(f"Error in streaming unfollow for {user.login}: {e}")
+            success, message = False, str(e)
+        finally:
+            slots.release()
+        with summary_lock:
+            if success:
+                summary['unfollowed'] += 1
+            else:
+                summary['failed'] += 1
+                if len(summary['failures']) < max_failures:
+                    summary['failures'][user.login] = message
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for user in users:
+            slots.acquire()
+            submit_with_context(executor, unfollow, user)
+
+    logger.info(f"Streaming unfollow finished: {summary['unfollowed']} unfollowed, "
+                f"{summary['failed']} failed")
+    logger.info(f"Mutation throughput: {mutation_pacer.status()}")
+    return summary
+
 def get_repository_owner_id(username):
     """Get the ID and type of a GitHub user or organization."""
     logger.debug(f"Fetching repository owner ID for {username}")
 
     # Check cache first
-    cache = load_cache()
     cache_key = f"owner_id_{username}"
+    with span('cache.lookup', key=cache_key) as cache_span:
+        cache = load_cache()
+        cache_span.set_attribute('hit', cache_key in cache)
 
     if cache_key in cache:
         logger.debug(f"Found cached owner ID for {username}")
@@ -449,7 +633,7 @@ def get_repository_owner_id(username):
     variables = {'username': username}
 
     try:
-        result = execute_github_graphql_query(query, variables)
+        result = execute_github_graphql_query(query, variables, read_only=True)
         owner = result['data']['repositoryOwner']
 
         if owner:
@@ -470,181 +654,178 @@ def get_repository_owner_id(username):
         logger.error(f'Error fetching repository owner ID for {username}: {e}')
         return None, None
 
-def get_followers_with_counts(batch_size=100):
-    """Get followers with follower/following counts."""
-    logger.info("Fetching followers with counts")
-    followers = []
-    cursor = None
+def _iter_pages(connection, fields, batch_size=100, cursor=None):
+    """Yield (records, cursor fetched after, end cursor) for each page, starting after `cursor`.
+
+    `fields` must already be normalized.
+    """
+    record_type = FollowingEdge if connection == 'following' else UserSummary
+    query = connection_page_query(connection, fields)
 
     while True:
         try:
-            query = '''
-            query ($cursor: String) {
-              viewer {
-                followers(first: 100, after: $cursor) {
-                  nodes {
-                    login
-                    followers {
-                      totalCount
-                    }
-                    following {
-                      totalCount
-                    }
-                  }
-                  pageInfo {
-                    hasNextPage
-                    endCursor
-                  }
-                }
-              }
-            }
-            '''
-            variables = {'cursor': cursor}
-            result = execute_github_graphql_query(query, variables)
-            viewer = result['data']['viewer']
-
-            batch_followers = [
-                {
-                    'login': node['login'],
-                    'followers': node['followers']['totalCount'],
-                    'following': node['following']['totalCount']
-                }
-                for node in viewer['followers']['nodes']
-            ]
-
-            followers.extend(batch_followers)
-            logger.debug(f"Fetched {len(batch_followers)} followers in this batch")
-
-            if viewer['followers']['pageInfo']['hasNextPage']:
-                cursor = viewer['followers']['pageInfo']['endCursor']
-                time.sleep(MIN_REQUEST_INTERVAL)
-            else:
-                break
+            variables = {'login': GITHUB_USERNAME, 'first': min(batch_size, 100), 'cursor': cursor}
+            result = execute_github_graphql_query(query, variables, read_only=True)
+            page = result['data']['user'][connection]
+
+            batch = [record_type.from_node(node, fields) for node in page['nodes']]
+            logger.debug(f"Fetched {len(batch)} {connection} in this batch")
 
+            has_next_page = page['pageInfo']['hasNextPage']
+            end_cursor = page['pageInfo']['endCursor']
+
+        except DeadlineExceeded:
+            # Callers decide what to do with the pages they already have
+            raise
         except Exception as e:
-            logger.error(f'Error fetching followers with counts: {e}')
-            break
+            logger.error(f'Error fetching {connection}: {e}')
+            raise IncompleteWalk(f"{connection} page after cursor {cursor} failed: {e}") from e
+
+        yield batch, cursor, end_cursor
+
+        if not has_next_page:
+            return
+        cursor = end_cursor
+        time.sleep(MIN_REQUEST_INTERVAL)
+
+def iter_connection_pages(connection, fields, batch_size=100):
+    """Yield a followers/following connection one page at a time, as each page arrives.
+
+    Only `fields` (names from queries.USER_FIELDS) are requested. Each page is a
+    list of UserSummary records for followers, or FollowingEdge records for
+    following.
+
+    Raises:
+        IncompleteWalk: If a page fails, after the pages before it were yielded.
+        DeadlineExceeded: If the current deadline passes before the last page.
+    """
+    for batch, _, _ in _iter_pages(connection, normalize_fields(fields), batch_size):
+        yield batch
+
+def walk_connection(connection, fields, batch_size=100):
+    """Collect a whole followers/following list, checkpointing it page by page.
+
+    A walk stopped by a failed page or the deadline returns what it has, marked
+    incomplete. The next walk of the same list and fields resumes after the last
+    good page, provided the list's first page is still the same (otherwise it
+    starts over, since the saved pages may have shifted).
+
+    Returns:
+        A WalkResult of UserSummary (followers) or FollowingEdge (following) records.
+    """
+    fields = normalize_fields(fields)
+    record_type = FollowingEdge if connection == 'following' else UserSummary
+    key = f"{GITHUB_USERNAME}.{connection}.{'-'.join(fields)}"
+    checkpoint = walks.load_checkpoint(key)
+    users = []
+    pages = _iter_pages(connection, fields, batch_size)
 
-    logger.info(f"Total followers fetched: {len(followers)}")
-    return followers
+    try:
+        if checkpoint is not None:
+            resume_cursor, saved = checkpoint
+            saved_users = [record_type.from_json(user) for user in saved]
+            first_page, after, end_cursor = next(pages)
+            compared = min(len(first_page), len(saved_users))
+            if [user.login for user in first_page[:compared]] == [user.login for user in saved_users[:compared]]:
+                logger.info(f"Resuming {connection} walk after {len(saved_users)} checkpointed users")
+                users = saved_users
+                pages = _iter_pages(connection, fields, batch_size, resume_cursor)
+            else:
+                logger.info(f"{connection} changed since the walk checkpoint; starting over")
+                walks.clear_checkpoint(key)
+                users.extend(first_page)
+                walks.save_page(key, after, end_cursor, [user.to_json() for user in first_page])
+
+        for batch, after, end_cursor in pages:
+            users.extend(batch)
+            walks.save_page(key, after, end_cursor, [user.to_json() for user in batch])
+    except (IncompleteWalk, DeadlineExceeded) as e:
+        logger.warning(f"{connection} walk stopped after {len(users)} users ({e}); "
+                       f"the next walk resumes from there")
+        return WalkResult(users, complete=False)
+
+    walks.clear_checkpoint(key)
+    logger.info(f"Total {connection} fetched: {len(users)}")
+    return WalkResult(users)
+
+@traced('paginate.followers_with_counts')
+def get_followers_with_counts(batch_size=100):
+    """Get followers with follower/following counts, as a WalkResult (see walk_connection)."""
+    logger.info("Fetching followers with counts")
+    return walk_connection('followers', FOLLOWER_COUNT_FIELDS, batch_size)
 
+@traced('paginate.followers')
 def get_followers(batch_size=100):
-    """Get usernames of followers."""
+    """Get usernames of followers, as a WalkResult (see walk_connection)."""
     logger.info("Fetching followers")
-    followers = []
-    cursor = None
-
-    while True:
-        try:
-            query = '''
-            query ($cursor: String) {
-              viewer {
-                followers(first: 100, after: $cursor) {
-                  nodes {
-                    login
-                  }
-                  pageInfo {
-                    hasNextPage
-                    endCursor
-                  }
-                }
-              }
-            }
-            '''
-            variables = {'cursor': cursor}
-            result = execute_github_graphql_query(query, variables)
-            viewer = result['data']['viewer']
-
-            batch_followers = [node['login'] for node in viewer['followers']['nodes']]
-            followers.extend(batch_followers)
+    followers = walk_connection('followers', ('login',), batch_size)
+    return WalkResult((user.login for user in followers), complete=followers.complete)
 
-            logger.debug(f"Fetched {len(batch_followers)} followers in this batch")
+@traced('probe.follow_lists')
+def probe_follow_lists():
+    """Fetch both list sizes and the cursor of each list's first entry in one query.
 
-            if viewer['followers']['pageInfo']['hasNextPage']:
-                cursor = viewer['followers']['pageInfo']['endCursor']
-                time.sleep(MIN_REQUEST_INTERVAL)
-            else:
-                break
+    Returns:
+        {'followers': {'total': n, 'head': cursor}, 'following': {...}}, or None
+        if the query failed. Equal probes mean the lists almost certainly didn't change.
+    """
+    query = '''
+    query ($login: String!) {
+      user(login: $login) {
+        followers(first: 1) {
+          totalCount
+          pageInfo {
+            endCursor
+          }
+        }
+        following(first: 1) {
+          totalCount
+          pageInfo {
+            endCursor
+          }
+        }
+      }
+    }
+    '''
+    try:
+        result = execute_github_graphql_query(query, {'login': GITHUB_USERNAME}, read_only=True)
+        owner = result['data']['user']
+        return {
+            name: {'total': owner[name]['totalCount'], 'head': owner[name]['pageInfo']['endCursor']}
+            for name in ('followers', 'following')
+        }
+    except Exception as e:
+        logger.error(f'Error probing follow lists: {e}')
+        return None
 
-        except Exception as e:
-            logger.error(f'Error fetching followers: {e}')
-            break
+def iter_following_pages(batch_size=100, fields=FOLLOWING_FIELDS):
+    """Yield the following list one page at a time, as soon as each page arrives.
 
-    logger.info(f"Total followers fetched: {len(followers)}")
-    return followers
+    Each page is a list of FollowingEdge records with the requested fields (by
+    default login, type, id and counts). Raises IncompleteWalk if a page fails,
+    like iter_connection_pages().
+    """
+    return iter_connection_pages('following', fields, batch_size)
 
-def get_following(batch_size=100):
-    """Get users being followed with additional metadata."""
+@traced('paginate.following')
+def get_following(batch_size=100, fields=FOLLOWING_FIELDS):
+    """Get users being followed with additional metadata, as a WalkResult (see walk_connection)."""
     logger.info("Fetching following")
-    following = []
-    cursor = None
-
-    while True:
-        try:
-            query = '''
-            query ($cursor: String) {
-              viewer {
-                following(first: 100, after: $cursor) {
-                  nodes {
-                    login
-                    __typename
-                    id
-                    followers {
-                        totalCount
-                    }
-                    following {
-                        totalCount
-                    }
-                  }
-                  pageInfo {
-                    hasNextPage
-                    endCursor
-                  }
-                }
-              }
-            }
-            '''
-            variables = {'cursor': cursor}
-            result = execute_github_graphql_query(query, variables)
-            viewer = result['data']['viewer']
-
-            batch_following = [
-                {
-                    'login': node['login'],
-                    'type': node['__typename'],
-                    'id': node['id'],
-                    'followers': node['followers']['totalCount'],
-                    'following': node['following']['totalCount']
-                }
-                for node in viewer['following']['nodes']
-            ]
-
-            following.extend(batch_following)
-            logger.debug(f"Fetched {len(batch_following)} following in this batch")
-
-            if viewer['following']['pageInfo']['hasNextPage']:
-                cursor = viewer['following']['pageInfo']['endCursor']
-                time.sleep(MIN_REQUEST_INTERVAL)
-            else:
-                break
-
-        except Exception as e:
-            logger.error(f'Error fetching following: {e}')
-            break
-
-    logger.info(f"Total following fetched: {len(following)}")
-    return following
+    return walk_connection('following', fields, batch_size)
 
 def check_if_user_follows_viewer(username):
     """Check if a specific user follows the viewer."""
     logger.debug(f"Checking if user {username} follows the viewer")
 
     # Check cache first
-    cache = load_cache()
     cache_key = f"follows_viewer_{username}"
     cache_ttl = 60 * 60 * 24  # 1 day in seconds
+    with span('cache.lookup', key=cache_key) as cache_span:
+        cache = load_cache()
+        hit = cache_key in cache and (time.time() - cache.get(cache_key, {}).get('timestamp', 0) < cache_ttl)
+        cache_span.set_attribute('hit', hit)
 
-    if cache_key in cache and (time.time() - cache.get(cache_key, {}).get('timestamp', 0) < cache_ttl):
+    if hit:
         logger.debug(f"Found cached follows status for {username}")
         return cache[cache_key]['follows']
 
@@ -681,3 +862,51 @@ def check_if_user_follows_viewer(username):
     except Exception as e:
         logger.error(f'Error checking if user {username} follows viewer: {e}')
         raise
+
+def check_users_follow_viewer(usernames, batch_size=100):
+    """Check which of many users follow the viewer.
+
+    Cached answers are used where fresh; the rest are resolved with aliased
+    `isFollowingViewer` lookups, `batch_size` users per query. The cache file is
+    loaded and saved once for the whole call.
+
+    Returns:
+        A dict mapping each username to True/False, or None if the user doesn't exist.
+    """
+    logger.info(f"Checking follow status for {len(usernames)} users")
+    results = {}
+    if not usernames:
+        return results
+
+    cache_ttl = 60 * 60 * 24  # 1 day in seconds
+    now = time.time()
+    with span('cache.lookup', key='follows_viewer_*', users=len(usernames)) as cache_span:
+        cache = load_cache()
+        missing = []
+        for username in usernames:
+            entry = cache.get(f"follows_viewer_{username}")
+            if entry and now - entry.get('timestamp', 0) < cache_ttl:
+                results[username] = entry['follows']
+            else:
+                missing.append(username)
+        cache_span.set_attribute('hits', len(results))
+
+    for batch in chunks(missing, batch_size):
+        query = users_by_login_query(len(batch), FOLLOWS_VIEWER_FIELDS)
+        variables = login_variables(batch)
+
+        # Unknown logins come back as NOT_FOUND errors next to the data for the rest
+        result = execute_github_graphql_query(query, variables, allow_partial=True)
+        data = result.get('data') or {}
+
+        for index, username in enumerate(batch):
+            user_data = data.get(f'user_{index}')
+            if user_data is None:
+                results[username] = None
+                continue
+            results[username] = user_data['isFollowingViewer']
+            cache[f"follows_viewer_{username}"] = {'follows': results[username], 'timestamp': now}
+
+    if missing:
+        save_cache(cache)
+    return results
@@ -0,0 +1,91 @@
+import atexit
+import itertools
+import logging
+import queue
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+from decouple import config
+
+LOG_FILE = config('LOG_FILE', default='app.log')
+LOG_LEVEL = config('LOG_LEVEL', default='DEBUG')
+# Loggers whose DEBUG records are sampled, and how many of them are kept (1 in N)
+LOG_SAMPLE_LOGGERS = config('LOG_SAMPLE_LOGGERS', default='utils,github_api')
+LOG_SAMPLE_EVERY = config('LOG_SAMPLE_EVERY', default=50, cast=int)
+# Failures listed individually in bulk-job summaries; the rest are only counted
+LOG_SUMMARY_MAX_FAILURES = config('LOG_SUMMARY_MAX_FAILURES', default=10, cast=int)
+
+LOG_FORMAT = '%(asctime)s [%(levelname)s] %(name)s: %(message)s'
+
+_listener = None
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one in `every` DEBUG records per call site; other levels always pass.
+
+    Attached to hot-path loggers so per-call debug messages (chunking, each
+    GraphQL attempt) don't flood the handlers, while still showing up in the log.
+    """
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(1, every)
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.every == 1:
+            return True
+        key = (record.name, record.lineno)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = itertools.count()
+            return next(counter) % self.every == 0
+
+
+def configure_logging(console_level=None):
+    """Route all logging through a queue to console and rotating file handlers.
+
+    Callers only pay for putting a record on a queue; a single QueueListener
+    thread does the formatting and I/O. Safe to call more than once: handlers are
+    only added the first time, so the web app, the scheduler and the CLI can all
+    call it on startup.
+
+    Args:
+        console_level: Level for the console (stderr) handler; defaults to
+            LOG_LEVEL. The log file always gets LOG_LEVEL.
+    """
+    global _listener
+
+    logger = logging.getLogger()
+    logger.setLevel(LOG_LEVEL)
+
+    if logger.handlers:
+        return logger
+
+    # Create handlers
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(console_level or LOG_LEVEL)
+
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5)
+    file_handler.setLevel(LOG_LEVEL)
+
+    # Create formatter and add it to the handlers
+    formatter = logging.Formatter(LOG_FORMAT)
+    console_handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    logger.addHandler(QueueHandler(log_queue))
+    _listener = QueueListener(log_queue, console_handler, file_handler, respect_handler_level=True)
+    _listener.start()
+    # Flush whatever is still queued on shutdown
+    atexit.register(_listener.stop)
+
+    sampling_filter = SamplingFilter(LOG_SAMPLE_EVERY)
+    for name in LOG_SAMPLE_LOGGERS.split(','):
+        if name.strip():
+            logging.getLogger(name.strip()).addFilter(sampling_filter)
+
+    return logger
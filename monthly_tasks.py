@@ -1,26 +1,65 @@
 import logging
+import snapshot_store
+from logging_config import LOG_SUMMARY_MAX_FAILURES
+from tracing import traced_job
 from github_api import (
     get_followers,
-    get_following,
-    bulk_unfollow_users,
+    iter_following_pages,
+    UNFOLLOW_FIELDS,
+    bulk_unfollow_owners,
 )
+from walks import IncompleteWalk
 
 logger = logging.getLogger('monthly_tasks')
 
+
+def _not_following_back(followers_set):
+    """Yield followed users missing from followers_set, page by page as they arrive."""
+    for page in iter_following_pages(fields=UNFOLLOW_FIELDS):
+        for user in page:
+            if user.login.lower() not in followers_set:
+                logger.debug(f"{user.login} is not following back")
+                yield user
+
+
+@traced_job
 def run_monthly_tasks():
     logger.info("Starting monthly tasks")
 
-    # Unfollow users who are not following back
+    # Unfollow users who are not following back. When the lists did change, the follower
+    # set has to be complete first; after that each following page is turned into
+    # unfollow work immediately.
     logger.info("Removing users who are not following back")
-    current_followers = get_followers()
-    current_following = get_following()
-    followers_set = set(current_followers)
-    following_usernames = [user['login'] for user in current_following]
-    not_following_back = [user for user in following_usernames if user not in followers_set]
-    logger.info(f"Users not following back: {not_following_back}")
-    if not_following_back:
-        unfollow_results = bulk_unfollow_users(not_following_back)
-        logger.info(f"Unfollow results: {unfollow_results}")
+    snapshot = snapshot_store.get_unchanged_snapshot()
+    if snapshot is not None:
+        # The change probe says the stored lists are still exact; no need to walk them
+        logger.info("Follow lists unchanged since the last snapshot; using it")
+        followers_set = {user.login.lower() for user in snapshot['followers']}
+        candidates = (user for user in snapshot['following'] if user.login.lower() not in followers_set)
+    else:
+        current_followers = get_followers()
+        if not current_followers.complete:
+            # Anyone missing from a partial list would look like they don't follow back
+            logger.warning(f"Follower list is incomplete ({len(current_followers)} fetched); "
+                           f"not unfollowing anyone this time")
+            logger.info("Monthly tasks completed")
+            return
+        followers_set = {login.lower() for login in current_followers}
+        candidates = _not_following_back(followers_set)
+    if not followers_set:
+        # An empty result almost always means the walk failed; don't unfollow everyone
+        logger.warning("No followers fetched; skipping unfollow step")
+        logger.info("Monthly tasks completed")
+        return
+    try:
+        unfollow_results = bulk_unfollow_owners(candidates, max_failures=LOG_SUMMARY_MAX_FAILURES)
+    except IncompleteWalk as e:
+        # Users already unfollowed were on exact following pages; the rest waits for the next run
+        logger.warning(f"Following walk failed part way; stopped unfollowing: {e}")
+        logger.info("Monthly tasks completed")
+        return
+    if unfollow_results['unfollowed'] or unfollow_results['failed']:
+        logger.info(f"Unfollow results: {unfollow_results}", extra={'job_summary': unfollow_results})
     else:
         logger.info("No users to unfollow")
 
@@ -0,0 +1,93 @@
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Dict
+
+logger = logging.getLogger(__name__)
+
+# How far spacing may be stretched after repeated secondary-limit responses
+MAX_SLOWDOWN = 8.0
+# Each successful mutation shrinks the slowdown by this factor, back toward 1
+RECOVERY_FACTOR = 0.9
+# GitHub asks for at least a minute's pause when a secondary limit has no Retry-After
+DEFAULT_SECONDARY_LIMIT_WAIT = 60.0
+
+
+class MutationPacer:
+    """Space out mutations across all threads and back off on secondary rate limits.
+
+    Every mutation reserves a start slot at least `60 / per_minute` seconds after
+    the previous one, so worker threads can't burst. A secondary-limit response
+    blocks all slots until its Retry-After has passed and doubles the spacing;
+    successes ease it back toward the configured rate.
+    """
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self._interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._slowdown = 1.0
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        # Completion times of recent mutations, for the observed rate
+        self._recent = deque()
+        self._completed = 0
+        self._secondary_limits = 0
+        self._waited = 0.0
+
+    def acquire(self) -> float:
+        """Block until this thread may send a mutation.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.time()
+                slot = max(now, self._next_slot, self._blocked_until)
+                self._next_slot = slot + self._interval * self._slowdown
+            if slot > now:
+                time.sleep(slot - now)
+                waited += slot - now
+            # A secondary limit may have come in while we slept; queue up again behind it
+            if time.time() >= self._blocked_until:
+                break
+        with self._lock:
+            self._waited += waited
+        return waited
+
+    def record_success(self) -> None:
+        now = time.time()
+        with self._lock:
+            self._completed += 1
+            self._recent.append(now)
+            self._slowdown = max(1.0, self._slowdown * RECOVERY_FACTOR)
+
+    def record_secondary_limit(self, retry_after: float = DEFAULT_SECONDARY_LIMIT_WAIT) -> None:
+        """Hold every mutation back for `retry_after` seconds and slow down afterwards."""
+        with self._lock:
+            self._secondary_limits += 1
+            self._blocked_until = max(self._blocked_until, time.time() + retry_after)
+            self._next_slot = max(self._next_slot, self._blocked_until)
+            self._slowdown = min(MAX_SLOWDOWN, self._slowdown * 2)
+            slowdown = self._slowdown
+        logger.warning(f"Secondary rate limit hit; pausing mutations for {retry_after:.0f}s "
+                       f"and slowing to {self.per_minute / slowdown:.1f}/min")
+
+    def status(self) -> Dict[str, Any]:
+        """Configured and current rate, observed throughput and back-off counters."""
+        now = time.time()
+        with self._lock:
+            while self._recent and now - self._recent[0] > 60:
+                self._recent.popleft()
+            return {
+                'limit_per_minute': self.per_minute,
+                'current_per_minute': round(self.per_minute / self._slowdown, 1),
+                'last_minute': len(self._recent),
+                'completed': self._completed,
+                'secondary_limits': self._secondary_limits,
+                'blocked_for_s': round(max(0.0, self._blocked_until - now), 1),
+                'waited_s': round(self._waited, 1),
+            }
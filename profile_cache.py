@@ -0,0 +1,143 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+from decouple import config
+
+from records import UserProfile
+from tracing import start_trace
+from utils import file_lock, load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+PROFILE_CACHE_FILE = config('PROFILE_CACHE_FILE', default='profile_cache.json')
+# Profiles younger than this are served as they are (seconds)
+PROFILE_FRESH_TTL = config('PROFILE_FRESH_TTL', default=6 * 60 * 60, cast=int)
+# Profiles older than PROFILE_FRESH_TTL but younger than this are served right away
+# and refreshed in the background; older ones are fetched before responding
+PROFILE_MAX_STALE = config('PROFILE_MAX_STALE', default=7 * 24 * 60 * 60, cast=int)
+
+# Fields stored per profile (see queries.USER_FIELDS)
+PROFILE_CACHE_FIELDS = ('login', 'type', 'followers', 'following', 'public_repos')
+
+# Cached UserProfile records keyed by lowercased login. Records are replaced on
+# refresh, never changed in place, so callers can keep the ones they were given.
+_lock = threading.Lock()
+_entries: Optional[Dict[str, UserProfile]] = None
+# Modification time of PROFILE_CACHE_FILE when it was last read or written by this process
+_entries_mtime: Optional[float] = None
+# Lowercased logins with a background refresh queued or running
+_refreshing = set()
+_revalidate_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='profile-revalidate')
+
+
+def _file_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(PROFILE_CACHE_FILE)
+    except OSError:
+        return None
+
+
+def _read_file() -> Dict[str, UserProfile]:
+    return {key: UserProfile.from_json(row) for key, row in load_json_file(PROFILE_CACHE_FILE).items()}
+
+
+def _ensure_loaded() -> Dict[str, UserProfile]:
+    global _entries, _entries_mtime
+
+    # Other processes (web workers, the scheduler's warmer) store profiles too
+    mtime = _file_mtime()
+    if _entries is None or mtime != _entries_mtime:
+        _entries = _read_file()
+        _entries_mtime = mtime
+        logger.debug(f"Loaded {len(_entries)} cached profiles")
+    return _entries
+
+
+def _save(entries: Dict[str, UserProfile]) -> None:
+    """Store profiles, merged with whatever other processes stored since we loaded; newest fetch wins."""
+    global _entries, _entries_mtime
+
+    with file_lock(PROFILE_CACHE_FILE):
+        merged = _read_file()
+        for key, profile in entries.items():
+            stored = merged.get(key)
+            if stored is None or (stored.fetched_at or 0) <= (profile.fetched_at or 0):
+                merged[key] = profile
+        save_json_file(PROFILE_CACHE_FILE, {
+            key: dict(profile.to_json(), fetched_at=profile.fetched_at) for key, profile in merged.items()
+        })
+        _entries = merged
+        _entries_mtime = _file_mtime()
+
+
+def _fetch(logins: List[str]) -> None:
+    """Fetch profiles from GitHub and store them. Logins GitHub doesn't return are left as they were."""
+    from github_api import get_users_info
+
+    profiles = get_users_info(logins, fields=PROFILE_CACHE_FIELDS)
+    now = time.time()
+    with _lock:
+        entries = _ensure_loaded()
+        for profile in profiles:
+            profile.fetched_at = now
+            entries[profile.login.lower()] = profile
+        _save(entries)
+    logger.debug(f"Cached {len(profiles)} of {len(logins)} requested profiles")
+
+
+def _revalidate(logins: List[str]) -> None:
+    try:
+        with start_trace('profile_cache.revalidate', users=len(logins)):
+            _fetch(logins)
+    except Exception:
+        logger.exception("Error refreshing cached profiles")
+    finally:
+        with _lock:
+            _refreshing.difference_update(login.lower() for login in logins)
+
+
+def _schedule_revalidation(logins: List[str]) -> None:
+    with _lock:
+        pending = [login for login in logins if login.lower() not in _refreshing]
+        _refreshing.update(login.lower() for login in pending)
+    if pending:
+        logger.debug(f"Refreshing {len(pending)} stale profiles in the background")
+        _revalidate_executor.submit(_revalidate, pending)
+
+
+def get_profiles(logins: Iterable[str]) -> List[UserProfile]:
+    """Return profiles for the given logins, like github_api.get_users_info.
+
+    Fresh profiles come straight from the cache. Stale ones are returned as
+    they are while a background batch refreshes them. Only logins with no usable
+    entry are fetched before returning.
+
+    Returns:
+        One UserProfile per login GitHub knows about, in the order given.
+    """
+    logins = list(logins)
+    now = time.time()
+    missing, stale = [], []
+    with _lock:
+        entries = _ensure_loaded()
+        for login in logins:
+            entry = entries.get(login.lower())
+            age = None if entry is None else now - entry.fetched_at
+            if age is None or age > PROFILE_MAX_STALE:
+                missing.append(login)
+            elif age > PROFILE_FRESH_TTL:
+                stale.append(login)
+
+    logger.debug(f"Profile cache: {len(logins) - len(missing) - len(stale)} fresh, "
+                 f"{len(stale)} stale, {len(missing)} missing")
+    if missing:
+        _fetch(missing)
+    if stale:
+        _schedule_revalidation(stale)
+
+    with _lock:
+        return [_entries[login.lower()] for login in logins if login.lower() in _entries]
@@ -0,0 +1,86 @@
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, Tuple
+
+# Fields callers can ask for on a User node: the GraphQL selection and how to read
+# the value back out of a node. Records (see records.py) use these names as attributes.
+USER_FIELDS: Dict[str, Tuple[str, Callable[[Dict[str, Any]], Any]]] = {
+    'login': ('login', lambda node: node['login']),
+    'type': ('__typename', lambda node: node['__typename']),
+    'id': ('id', lambda node: node['id']),
+    'followers': ('followers { totalCount }', lambda node: node['followers']['totalCount']),
+    'following': ('following { totalCount }', lambda node: node['following']['totalCount']),
+    'bio': ('bio', lambda node: node.get('bio') or ''),
+    'public_repos': ('repositories(privacy: PUBLIC) { totalCount }',
+                     lambda node: node['repositories']['totalCount']),
+    'follows_viewer': ('isFollowingViewer', lambda node: node['isFollowingViewer']),
+}
+
+
+def normalize_fields(fields: Iterable[str]) -> Tuple[str, ...]:
+    """Validate a field list and put it in canonical order.
+
+    `login` is always included, since results are keyed by it. Equal field sets
+    normalize to the same tuple, so they share one cached document.
+
+    Raises:
+        ValueError: If a field is not in USER_FIELDS.
+    """
+    fields = set(fields)
+    unknown = fields - USER_FIELDS.keys()
+    if unknown:
+        raise ValueError(f"Unknown user fields: {', '.join(sorted(unknown))}")
+    fields.add('login')
+    return tuple(name for name in USER_FIELDS if name in fields)
+
+
+def _fragment_name(fields: Tuple[str, ...]) -> str:
+    return 'User_' + '_'.join(fields)
+
+
+@lru_cache(maxsize=None)
+def user_fragment(fields: Tuple[str, ...]) -> str:
+    """Return a named fragment on User selecting `fields` (already normalized)."""
+    selections = '\n  '.join(USER_FIELDS[name][0] for name in fields)
+    return f"fragment {_fragment_name(fields)} on User {{\n  {selections}\n}}"
+
+
+@lru_cache(maxsize=None)
+def connection_page_query(connection: str, fields: Tuple[str, ...]) -> str:
+    """Return the document for one page of a user's followers or following.
+
+    Variables: `login`, `first` (page size, at most 100) and `cursor`.
+    """
+    return f'''query ($login: String!, $first: Int!, $cursor: String) {{
+  user(login: $login) {{
+    {connection}(first: $first, after: $cursor) {{
+      nodes {{
+        ...{_fragment_name(fields)}
+      }}
+      pageInfo {{
+        hasNextPage
+        endCursor
+      }}
+    }}
+  }}
+}}
+{user_fragment(fields)}'''
+
+
+@lru_cache(maxsize=None)
+def users_by_login_query(count: int, fields: Tuple[str, ...]) -> str:
+    """Return a document looking up `count` users at once.
+
+    Users are aliased `user_0` .. `user_{count-1}` and bound to the variables
+    `login_0` .. `login_{count-1}`.
+    """
+    declarations = ', '.join(f'$login_{index}: String!' for index in range(count))
+    lookups = '\n  '.join(
+        f'user_{index}: user(login: $login_{index}) {{ ...{_fragment_name(fields)} }}'
+        for index in range(count)
+    )
+    return f"query ({declarations}) {{\n  {lookups}\n}}\n{user_fragment(fields)}"
+
+
+def login_variables(logins: Iterable[str]) -> Dict[str, str]:
+    """Variables for users_by_login_query."""
+    return {f'login_{index}': login for index, login in enumerate(logins)}
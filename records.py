@@ -0,0 +1,93 @@
+from typing import Any, Dict, Optional, Tuple
+
+from queries import USER_FIELDS
+
+
+class _Record:
+    """Base for the slotted user records built straight from GraphQL nodes.
+
+    Subclasses list their attributes in `_fields`; optional ones default to
+    None, since callers only request the fields they need (see queries.py).
+    """
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+    # Attribute name -> JSON key, where they differ
+    _json_keys: Dict[str, str] = {}
+
+    def __init__(self, login: str, **values: Any):
+        self.login = login
+        for name in self._fields[1:]:
+            setattr(self, name, values.pop(name, None))
+        if values:
+            raise TypeError(f"Unexpected fields for {type(self).__name__}: {', '.join(values)}")
+
+    @classmethod
+    def from_node(cls, node: Dict[str, Any], fields: Tuple[str, ...]):
+        """Build a record from a node selected with queries.user_fragment(fields)."""
+        return cls(**{name: USER_FIELDS[name][1](node) for name in fields if name in cls._fields})
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]):
+        """Inverse of to_json; keys the record doesn't know are ignored."""
+        values = {name: data.get(cls._json_keys.get(name, name)) for name in cls._fields}
+        return cls(**values)
+
+    def to_json(self) -> Dict[str, Any]:
+        """The record as a JSON-ready dict, leaving out fields that weren't fetched."""
+        result = {}
+        for name in self._fields:
+            value = getattr(self, name)
+            if value is not None:
+                result[self._json_keys.get(name, name)] = value
+        return result
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_json()!r})"
+
+
+class UserSummary(_Record):
+    """A follower: login, type, node ID, counts and when it first showed up in a snapshot."""
+
+    __slots__ = ('login', 'type', 'id', 'followers', 'following', 'first_seen')
+    _fields = __slots__
+
+    @property
+    def difference(self) -> Optional[int]:
+        """How many more users they follow than follow them."""
+        if self.followers is None or self.following is None:
+            return None
+        return self.following - self.followers
+
+    def to_json(self) -> Dict[str, Any]:
+        result = super().to_json()
+        if self.difference is not None:
+            result['difference'] = self.difference
+        return result
+
+
+class FollowingEdge(UserSummary):
+    """Someone we follow. Same fields as UserSummary; type and id are what unfollowing needs."""
+
+    __slots__ = ()
+
+
+class UserProfile(_Record):
+    """Profile details used to enrich dashboard lists, plus when they were fetched."""
+
+    __slots__ = ('login', 'type', 'followers', 'following', 'bio', 'public_repos', 'fetched_at')
+    _fields = __slots__
+    # Profile rows have always exposed the node type as __typename
+    _json_keys = {'type': '__typename'}
+
+    def to_json(self) -> Dict[str, Any]:
+        result = super().to_json()
+        result.pop('fetched_at', None)
+        return result
+
+
+def to_json_default(value: Any) -> Dict[str, Any]:
+    """`default` hook for JSON encoders, so records serialize without copying lists first."""
+    if isinstance(value, _Record):
+        return value.to_json()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
@@ -0,0 +1,87 @@
+import gzip
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from decouple import config
+from flask import Response, request
+
+from utils import dumps
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent uncompressed; gzip overhead isn't worth it
+GZIP_MIN_SIZE = config('GZIP_MIN_SIZE', default=1024, cast=int)
+GZIP_LEVEL = config('GZIP_LEVEL', default=6, cast=int)
+# Number of compressed bodies kept, keyed by ETag, so repeat loads skip compression
+COMPRESSED_CACHE_SIZE = config('COMPRESSED_CACHE_SIZE', default=16, cast=int)
+
+_compressed_cache = OrderedDict()
+_compressed_cache_lock = threading.Lock()
+
+
+def _make_etag(value: bytes) -> str:
+    return hashlib.sha1(value).hexdigest()
+
+
+def _gzip_cached(etag: str, body: bytes) -> bytes:
+    with _compressed_cache_lock:
+        compressed = _compressed_cache.get(etag)
+        if compressed is not None:
+            _compressed_cache.move_to_end(etag)
+            return compressed
+
+    compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+    with _compressed_cache_lock:
+        _compressed_cache[etag] = compressed
+        while len(_compressed_cache) > COMPRESSED_CACHE_SIZE:
+            _compressed_cache.popitem(last=False)
+    return compressed
+
+
+def json_response(payload: Any, version: Optional[str] = None, status: int = 200) -> Response:
+    """Build a cacheable JSON response for the current request.
+
+    The ETag comes from `version` when the caller knows which snapshot the payload
+    was built from, otherwise from the serialized body. Clients that send a
+    matching If-None-Match get an empty 304. Bodies are gzip-compressed when the
+    client accepts it.
+
+    `payload` may be a zero-argument callable; with a `version` it is only called
+    when the client's copy is stale.
+    """
+    body = None
+    if version is None:
+        if callable(payload):
+            payload = payload()
+        body = dumps(payload)
+        etag = _make_etag(body)
+    else:
+        etag = _make_etag(str(version).encode('utf-8'))
+
+    # Weak ETags: the gzip and identity encodings of a payload share one tag
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    if body is None:
+        body = dumps(payload() if callable(payload) else payload)
+
+    response = Response(mimetype='application/json', status=status)
+    if len(body) >= GZIP_MIN_SIZE and 'gzip' in request.accept_encodings:
+        response.set_data(_gzip_cached(etag, body))
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response.set_data(body)
+
+    response.set_etag(etag, weak=True)
+    # Browsers may store the body but must revalidate it on every load
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept-Encoding'
+    logger.debug(f"JSON response: {len(body)} bytes raw, {response.content_length} bytes sent")
+    return response
@@ -1,33 +1,41 @@
 import logging
-from logging.handlers import RotatingFileHandler
+import os
+import threading
+import time
 from datetime import datetime, timedelta
-from apscheduler.schedulers.blocking import BlockingScheduler
-from tzlocal import get_localzone
 
-from daily_tasks import run_daily_tasks
-from monthly_tasks import run_monthly_tasks
+from decouple import config
+from tzlocal import get_localzone
 
+from deadlines import with_deadline
+from logging_config import configure_logging
+from tracing import traced_job
 
-LOG_FILE = 'app.log'
 
-# Set up logging configuration (reuse same format and file as app.py)
 logger = logging.getLogger('scheduler')
-logger.setLevel(logging.DEBUG)
-
-# Avoid adding duplicate handlers if re-imported
-if not logger.handlers:
-    console_handler = logging.StreamHandler()
-    console_handler.setLevel(logging.DEBUG)
-
-    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=5 * 1024 * 1024, backupCount=5)
-    file_handler.setLevel(logging.DEBUG)
-
-    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(name)s: %(message)s')
-    console_handler.setFormatter(formatter)
-    file_handler.setFormatter(formatter)
 
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+# Only the process holding this lock runs scheduled jobs. Every web worker may try,
+# but the daily/monthly tasks must never run once per worker.
+SCHEDULER_LOCK_FILE = config('SCHEDULER_LOCK_FILE', default='scheduler.lock')
+# How often a standby process retries the leader lock (seconds)
+SCHEDULER_LOCK_RETRY = config('SCHEDULER_LOCK_RETRY', default=60, cast=int)
+
+# Daily follows are spread over this window (local hours, end exclusive), one small
+# slot every DAILY_FOLLOW_SLOT_MINUTES, instead of one burst
+DAILY_FOLLOW_WINDOW_START = config('DAILY_FOLLOW_WINDOW_START', default=9, cast=int)
+DAILY_FOLLOW_WINDOW_END = config('DAILY_FOLLOW_WINDOW_END', default=21, cast=int)
+DAILY_FOLLOW_SLOT_MINUTES = config('DAILY_FOLLOW_SLOT_MINUTES', default=30, cast=int)
+MONTHLY_TASK_HOUR = config('MONTHLY_TASK_HOUR', default=14, cast=int)
+MONTHLY_TASK_MINUTE = config('MONTHLY_TASK_MINUTE', default=5, cast=int)
+# Daily reconciliation of the local following index with GitHub
+FOLLOWING_RECONCILE_HOUR = config('FOLLOWING_RECONCILE_HOUR', default=3, cast=int)
+# Longest a scheduled job may run (seconds); GitHub calls past it are abandoned
+JOB_DEADLINE = config('JOB_DEADLINE', default=60 * 60, cast=int)
+
+_leader_lock_handle = None
+_leader_lock_guard = threading.Lock()
+_background_scheduler = None
+_standby_thread = None
 
 
 def _is_last_day_of_month(dt: datetime) -> bool:
@@ -36,8 +44,11 @@ def _is_last_day_of_month(dt: datetime) -> bool:
     return next_day.month != dt.month
 
 
+@traced_job
 def run_monthly_if_last_day():
     """Run monthly tasks only if today is the last day of the month."""
+    from monthly_tasks import run_monthly_tasks
+
     now = datetime.now(get_localzone())
     if _is_last_day_of_month(now):
         logger.info("Today is the last day of the month. Running monthly tasks...")
@@ -49,17 +60,164 @@ def run_monthly_if_last_day():
         logger.info("Not the last day of the month. Skipping monthly tasks.")
 
 
+@traced_job
+def reconcile_following_index():
+    """Re-sync the snapshot and the local following index with GitHub.
+
+    Goes through the snapshot's change probe, so on days when neither list
+    changed this costs a single query instead of two full walks.
+    """
+    import snapshot_store
+
+    try:
+        snapshot_store.sync()
+    except Exception:
+        logger.exception("Error while reconciling the following index")
+
+
+def acquire_leader_lock(path: str = None) -> bool:
+    """Try to become the single process allowed to run scheduled jobs.
+
+    Takes a non-blocking exclusive lock on SCHEDULER_LOCK_FILE. The lock is held for
+    the lifetime of the process and released by the OS when it exits.
+
+    Returns:
+        True if this process holds the lock (now or already), False otherwise.
+    """
+    global _leader_lock_handle
+
+    with _leader_lock_guard:
+        if _leader_lock_handle is not None:
+            return True
+
+        path = os.path.abspath(path or SCHEDULER_LOCK_FILE)
+        handle = open(path, 'a+')
+        try:
+            if os.name == 'nt':
+                import msvcrt
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            return False
+
+        handle.seek(0)
+        handle.truncate()
+        handle.write(f"{os.getpid()}\n")
+        handle.flush()
+        _leader_lock_handle = handle
+        logger.info(f"Acquired scheduler leader lock {path} (pid {os.getpid()})")
+        return True
+
+
+def register_jobs(scheduler):
+    """Register the scheduled jobs on an APScheduler instance.
+
+    This is the only place jobs are defined, so the web app and the standalone
+    scheduler always run the same schedule. Every job runs under JOB_DEADLINE.
+    """
+    from daily_tasks import run_daily_follow_slot
+
+    within_deadline = with_deadline(JOB_DEADLINE)
+
+    # Daily: follow suggested users, a few per slot across the follow window. The first
+    # slot runs right away so a restart picks up whatever is left of today's quota.
+    scheduler.add_job(within_deadline(run_daily_follow_slot), 'interval',
+                      minutes=DAILY_FOLLOW_SLOT_MINUTES,
+                      kwargs={'window_start_hour': DAILY_FOLLOW_WINDOW_START,
+                              'window_end_hour': DAILY_FOLLOW_WINDOW_END,
+                              'slot_minutes': DAILY_FOLLOW_SLOT_MINUTES},
+                      next_run_time=datetime.now(get_localzone()), coalesce=True,
+                      id='daily_follow', replace_existing=True)
+
+    # Monthly (last day): unfollow users who don't follow back
+    scheduler.add_job(within_deadline(run_monthly_if_last_day), 'cron',
+                      hour=MONTHLY_TASK_HOUR, minute=MONTHLY_TASK_MINUTE,
+                      id='monthly_unfollow_last_day', replace_existing=True)
+
+    # Keep dashboard data warm while people are using it; also runs right away at startup
+    from warmer import WARMER_INTERVAL_MINUTES, warm_dashboard_caches
+    scheduler.add_job(within_deadline(warm_dashboard_caches), 'interval',
+                      minutes=WARMER_INTERVAL_MINUTES,
+                      next_run_time=datetime.now(get_localzone()), coalesce=True, max_instances=1,
+                      id='warm_dashboard_caches', replace_existing=True)
+
+    # Daily: catch follows/unfollows made outside this app
+    scheduler.add_job(within_deadline(reconcile_following_index), 'cron',
+                      hour=FOLLOWING_RECONCILE_HOUR, minute=0,
+                      id='reconcile_following_index', replace_existing=True)
+
+
+def start_background_scheduler():
+    """Start a BackgroundScheduler in this process if it can take the leader lock.
+
+    Processes that lose the race keep retrying in a daemon thread, so another
+    worker takes over the jobs if the leader exits.
+
+    Returns:
+        The started scheduler, or None if another process is the leader.
+    """
+    global _background_scheduler
+
+    if _background_scheduler is not None:
+        return _background_scheduler
+
+    if not acquire_leader_lock():
+        logger.info("Another process holds the scheduler lock; this process will stand by")
+        _start_standby_thread()
+        return None
+
+    from apscheduler.schedulers.background import BackgroundScheduler
+    import atexit
+
+    scheduler = BackgroundScheduler(timezone=get_localzone())
+    register_jobs(scheduler)
+    scheduler.start()
+    _background_scheduler = scheduler
+
+    # Ensure the scheduler shuts down gracefully
+    atexit.register(lambda: scheduler.shutdown(wait=False))
+    return scheduler
+
+
+def _start_standby_thread():
+    global _standby_thread
+
+    if _standby_thread is not None:
+        return
+
+    def standby():
+        while True:
+            time.sleep(SCHEDULER_LOCK_RETRY)
+            if acquire_leader_lock():
+                logger.info("Scheduler leader lock acquired by standby process; starting jobs")
+                start_background_scheduler()
+                return
+
+    _standby_thread = threading.Thread(target=standby, name='scheduler-standby', daemon=True)
+    _standby_thread.start()
+
+
 def main():
-    logger.info("Starting standalone scheduler (daily at 14:00, monthly on last day at 14:05)")
+    configure_logging()
+
+    if not acquire_leader_lock():
+        logger.error(f"Another process already holds {SCHEDULER_LOCK_FILE}; not starting a second scheduler")
+        raise SystemExit(1)
 
-    tz = get_localzone()
-    scheduler = BlockingScheduler(timezone=tz)
+    from apscheduler.schedulers.blocking import BlockingScheduler
 
-    # Daily: follow 50 users at 14:00 local time
-    scheduler.add_job(run_daily_tasks, 'cron', hour=14, minute=0, id='daily_follow_2pm')
+    logger.info(
+        f"Starting standalone scheduler (daily follows {DAILY_FOLLOW_WINDOW_START:02d}:00-"
+        f"{DAILY_FOLLOW_WINDOW_END:02d}:00 every {DAILY_FOLLOW_SLOT_MINUTES} min, "
+        f"monthly on last day at {MONTHLY_TASK_HOUR:02d}:{MONTHLY_TASK_MINUTE:02d})"
+    )
 
-    # Monthly (last day): check at 14:05 local time
-    scheduler.add_job(run_monthly_if_last_day, 'cron', hour=14, minute=5, id='monthly_unfollow_last_day')
+    scheduler = BlockingScheduler(timezone=get_localzone())
+    register_jobs(scheduler)
 
     try:
         scheduler.start()
@@ -0,0 +1,425 @@
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set
+
+from decouple import config
+
+import change_log
+import deadlines
+import following_index
+import profile_cache
+from deadlines import DeadlineExceeded
+from tracing import span
+from utils import load_json_file, save_json_file, submit_with_context
+from records import FollowingEdge, UserProfile, UserSummary
+from views import by_login, count_unenriched, refresh_views
+from walks import WalkResult
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = config('SNAPSHOT_FILE', default='followers_snapshot.json')
+# How long a snapshot may be served instead of asking GitHub again (seconds)
+SNAPSHOT_TTL = config('SNAPSHOT_TTL', default=config('FOLLOWER_SNAPSHOT_TTL', default=600, cast=int), cast=int)
+# Even when the change probe says nothing changed, walk both lists after this long
+# (seconds), since it can't see the follower counts of individual users change
+SNAPSHOT_FULL_SYNC_INTERVAL = config('SNAPSHOT_FULL_SYNC_INTERVAL', default=24 * 60 * 60, cast=int)
+# Change probe counters, kept out of the snapshot so counting a probe doesn't rewrite it
+PROBE_STATS_FILE = config('PROBE_STATS_FILE', default='probe_stats.json')
+
+# The snapshot holds both lists plus the views derived from them:
+#   {'version': n, 'taken_at': ..., 'walked_at': ..., 'stale': bool,
+#    'probe': {'followers': {'total', 'head'}, 'following': {...}},
+#    'followers': [UserSummary], 'following': [FollowingEdge],
+#    'views': {'users_more_following': [UserSummary], 'not_following_back': [UserProfile],
+#              'not_following_back_unenriched': rows enrichment didn't reach},
+#    'recent_unfollows': {login: time}, 'stale_at': time}
+# recent_unfollows and stale_at let a sync that was walking while apply_unfollow or
+# mark_stale ran keep their effect instead of saving over it.
+# A sync whose walks were cut short (a failed page or the deadline) returns the rows
+# walked so far with 'partial': True; partial snapshots are never stored.
+# On disk the records are stored with to_json, and users_more_following as the
+# logins of the followers it references.
+# `version` changes whenever any of the lists or views change, so responses built
+# from it can be revalidated without rebuilding them.
+_lock = threading.Lock()
+# Held for the whole of a sync so concurrent requests share one walk
+_sync_lock = threading.Lock()
+_snapshot: Optional[Dict[str, Any]] = None
+# Modification time of SNAPSHOT_FILE when it was last read or written by this process
+_snapshot_mtime: Optional[float] = None
+_probe_stats_lock = threading.Lock()
+
+
+def _file_mtime() -> Optional[float]:
+    try:
+        return os.path.getmtime(SNAPSHOT_FILE)
+    except OSError:
+        return None
+
+
+def _ensure_loaded() -> Dict[str, Any]:
+    global _snapshot, _snapshot_mtime
+
+    # Another process (e.g. the scheduler's cache warmer) may have written a newer snapshot
+    mtime = _file_mtime()
+    if _snapshot is None or mtime != _snapshot_mtime:
+        _snapshot = read_snapshot_file()
+        _snapshot_mtime = mtime
+    return _snapshot
+
+
+def read_snapshot_file() -> Dict[str, Any]:
+    """Read and decode SNAPSHOT_FILE, leaving the in-memory snapshot alone."""
+    return _from_stored(load_json_file(SNAPSHOT_FILE))
+
+
+def _save(snapshot: Dict[str, Any]) -> None:
+    global _snapshot, _snapshot_mtime
+
+    _snapshot = snapshot
+    save_json_file(SNAPSHOT_FILE, _to_stored(snapshot))
+    _snapshot_mtime = _file_mtime()
+
+
+def _from_stored(data: Dict[str, Any]) -> Dict[str, Any]:
+    if 'version' not in data:
+        # Written by an older version without views; the next sync rebuilds it
+        return {}
+    followers = [UserSummary.from_json(row) for row in data['followers']]
+    current_followers = by_login(followers)
+    views = data['views']
+    more_following = (current_followers.get(login) for login in views['users_more_following'])
+    return dict(
+        data,
+        followers=followers,
+        following=[FollowingEdge.from_json(row) for row in data['following']],
+        views=dict(
+            views,
+            users_more_following=[follower for follower in more_following if follower is not None],
+            not_following_back=[UserProfile.from_json(row) for row in views['not_following_back']],
+        ),
+    )
+
+
+def _to_stored(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    views = snapshot['views']
+    return dict(
+        snapshot,
+        followers=[follower.to_json() for follower in snapshot['followers']],
+        following=[user.to_json() for user in snapshot['following']],
+        views=dict(
+            views,
+            users_more_following=[follower.login.lower() for follower in views['users_more_following']],
+            not_following_back=[profile.to_json() for profile in views['not_following_back']],
+        ),
+    )
+
+
+def _is_fresh(snapshot: Dict[str, Any], max_age: int) -> bool:
+    taken_at = snapshot.get('taken_at')
+    return taken_at is not None and not snapshot.get('stale') and time.time() - taken_at <= max_age
+
+
+def _carry_first_seen(previous_users: List[UserSummary], users: List[UserSummary], now: float) -> None:
+    first_seen = {user.login.lower(): user.first_seen for user in previous_users}
+    for user in users:
+        user.first_seen = first_seen.get(user.login.lower()) or now
+
+
+def _unchanged_lists(snapshot: Dict[str, Any], probe: Optional[Dict[str, Any]]) -> Set[str]:
+    """Names of the lists whose size and head cursor match the stored snapshot."""
+    if probe is None or not snapshot.get('probe'):
+        return set()
+    return {name for name in ('followers', 'following') if snapshot['probe'].get(name) == probe[name]}
+
+
+def _load_probe_stats() -> Dict[str, int]:
+    return {'probes': 0, 'walks_saved': 0, **load_json_file(PROBE_STATS_FILE)}
+
+
+def _record_probe(walks_saved: int) -> None:
+    with _probe_stats_lock:
+        stats = _load_probe_stats()
+        stats['probes'] += 1
+        stats['walks_saved'] += walks_saved
+        save_json_file(PROBE_STATS_FILE, stats)
+    logger.info(f"Change probe saved {walks_saved} list walk(s); {stats['walks_saved']} saved over {stats['probes']} probes")
+
+
+def _walk(connection: str, fields) -> WalkResult:
+    """Walk a whole list; the result is incomplete if a page failed or the deadline passed."""
+    from github_api import walk_connection
+
+    with span(f'paginate.{connection}') as walk_span:
+        users = walk_connection(connection, fields)
+        walk_span.set_attribute('complete', users.complete)
+    return users
+
+
+def _partial_snapshot(previous: Dict[str, Any], followers: List[UserSummary], following: List[FollowingEdge],
+                      followers_complete: bool) -> Dict[str, Any]:
+    """What an interrupted sync (failed page or deadline) got, flagged partial and not stored.
+
+    Until the follower walk is complete nobody can be said not to follow back,
+    so not_following_back stays empty.
+    """
+    now = time.time()
+    _carry_first_seen(previous.get('followers', []), followers, now)
+    _carry_first_seen(previous.get('following', []), following, now)
+    views = refresh_views(previous, followers, following if followers_complete else [],
+                          enrich=profile_cache.get_profiles)
+    return {
+        'version': previous.get('version', 0),
+        'taken_at': now,
+        'partial': True,
+        'followers': followers,
+        'following': following,
+        'views': views,
+    }
+
+
+def _sync_locked() -> Dict[str, Any]:
+    from github_api import FOLLOWER_COUNT_FIELDS, FOLLOWING_FIELDS, probe_follow_lists
+
+    with _lock:
+        previous = _ensure_loaded()
+    started_at = time.time()
+
+    probe = probe_follow_lists()
+    unchanged = _unchanged_lists(previous, probe)
+    # Follower counts of individual users drift without changing either list, so
+    # walk everything now and then even if the probe says nothing changed
+    if time.time() - previous.get('walked_at', 0) > SNAPSHOT_FULL_SYNC_INTERVAL:
+        unchanged = set()
+
+    if unchanged == {'followers', 'following'}:
+        _record_probe(2)
+        with _lock:
+            _save(dict(_ensure_loaded(), taken_at=time.time(), stale=False))
+            return _snapshot
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as executor:
+        followers_future = None if 'followers' in unchanged else submit_with_context(
+            executor, _walk, 'followers', FOLLOWER_COUNT_FIELDS)
+        following_future = None if 'following' in unchanged else submit_with_context(
+            executor, _walk, 'following', FOLLOWING_FIELDS)
+        followers = followers_future.result() if followers_future else WalkResult(previous['followers'])
+        following = following_future.result() if following_future else WalkResult(previous['following'])
+    if unchanged:
+        _record_probe(len(unchanged))
+    if not (followers.complete and following.complete):
+        # The rest is fetched by the next sync, which resumes both walks from their checkpoints
+        return _partial_snapshot(previous, followers, following, followers.complete)
+
+    if (not followers and previous.get('followers')) or (not following and previous.get('following')):
+        # An empty walk almost always means it failed; don't wipe the views
+        logger.warning("Follower or following walk returned no users; keeping the previous snapshot")
+        return previous
+
+    now = time.time()
+    _carry_first_seen(previous.get('followers', []), followers, now)
+    _carry_first_seen(previous.get('following', []), following, now)
+    views = refresh_views(previous, followers, following, enrich=profile_cache.get_profiles)
+
+    with _lock:
+        # Unfollows and follows may have been applied (here or in another process) while
+        # we walked; build on the snapshot as it is now, not as it was when we started
+        current = _ensure_loaded()
+        following, views = _without_unfollows_since(current, following, views, started_at)
+        snapshot = {
+            'version': current.get('version', 0) + 1,
+            'taken_at': now,
+            'walked_at': now if not unchanged else previous.get('walked_at', now),
+            # A follow made during the walk may not be in it yet
+            'stale': bool(current.get('stale')) and current.get('stale_at', 0) >= started_at,
+            'probe': probe,
+            'followers': followers,
+            'following': following,
+            'views': views,
+        }
+        _save(snapshot)
+    logger.info(f"Snapshot v{snapshot['version']}: {len(followers)} followers, {len(following)} following")
+    if current.get('version'):
+        # The first snapshot has nothing to compare with; everyone would count as new
+        change_log.record(change_log.diff_lists(current['followers'], followers,
+                                                current['following'], following), at=now)
+
+    if 'following' not in unchanged or not following_index.is_synced():
+        # We already paid for a full following walk; use it to refresh the local index
+        following_index.reconcile(following, walk_started_at=started_at)
+    return snapshot
+
+
+def _without_unfollows_since(current: Dict[str, Any], following: List[FollowingEdge], views: Dict[str, Any],
+                             since: float):
+    """Drop users apply_unfollow removed after `since` from a walked following list and its views.
+
+    The walk may have fetched their page before the unfollow went through.
+    """
+    unfollowed = {login for login, at in current.get('recent_unfollows', {}).items() if at >= since}
+    if not unfollowed:
+        return following, views
+    following = [user for user in following if user.login.lower() not in unfollowed]
+    not_following_back = [row for row in views['not_following_back'] if row.login.lower() not in unfollowed]
+    return following, dict(views, not_following_back=not_following_back,
+                           not_following_back_unenriched=count_unenriched(not_following_back))
+
+
+def sync() -> Dict[str, Any]:
+    """Walk followers and following, refresh the derived views and store the result.
+
+    A change probe runs first, and a list whose size and head cursor match the
+    stored snapshot is not walked again. The remaining walks run in parallel.
+    Views are refreshed incrementally from the previous snapshot, and profiles
+    come from the profile cache, so only users it doesn't hold yet are fetched.
+
+    Returns:
+        The new snapshot, or the previous one if a walk came back empty. If a
+        walk was interrupted, a partial snapshot (see above) that isn't stored.
+
+    Raises:
+        DeadlineExceeded: If the deadline passes while another sync is running.
+    """
+    if not _acquire_sync_lock():
+        raise DeadlineExceeded("Deadline exceeded waiting for another sync to finish")
+    try:
+        return _sync_locked()
+    finally:
+        _sync_lock.release()
+
+
+def _acquire_sync_lock() -> bool:
+    """Wait for _sync_lock, but not past the current deadline. Returns whether it was acquired."""
+    left = deadlines.remaining()
+    return _sync_lock.acquire(timeout=-1 if left is None else left)
+
+
+def get_snapshot(max_age: Optional[int] = None, force: bool = False) -> Dict[str, Any]:
+    """Return the current snapshot, syncing first if it is missing, stale or forced.
+
+    Args:
+        max_age: Maximum snapshot age in seconds (SNAPSHOT_TTL by default).
+        force: Sync even if the snapshot is fresh.
+
+    Returns:
+        The snapshot dict described at the top of this module. If the deadline
+        passes while another sync holds the lock, the stored snapshot marked
+        partial.
+    """
+    max_age = SNAPSHOT_TTL if max_age is None else max_age
+    with _lock:
+        snapshot = _ensure_loaded()
+        if not force and _is_fresh(snapshot, max_age):
+            return snapshot
+        seen_taken_at = snapshot.get('taken_at')
+
+    if not _acquire_sync_lock():
+        # Another sync (the warmer or a job, with far more time than a request) is still
+        # running; answer with what is stored rather than wait past the deadline
+        logger.warning("Deadline passed waiting for a running sync; serving the stored snapshot as partial")
+        with _lock:
+            return dict(_ensure_loaded(), partial=True)
+    try:
+        with _lock:
+            snapshot = _ensure_loaded()
+        if snapshot.get('taken_at') != seen_taken_at and _is_fresh(snapshot, max_age):
+            # Another request synced while we were waiting for the lock
+            return snapshot
+        return _sync_locked()
+    finally:
+        _sync_lock.release()
+
+
+def get_stored_snapshot() -> Dict[str, Any]:
+    """Return the stored snapshot however old it is, or {} if there is none. Never syncs."""
+    with _lock:
+        return _ensure_loaded()
+
+
+def get_unchanged_snapshot() -> Optional[Dict[str, Any]]:
+    """Return the stored snapshot if a change probe shows both lists are unchanged.
+
+    For jobs that need exact lists but not fresh per-user counts: when this
+    returns a snapshot its followers and following can be used without walking.
+    """
+    from github_api import probe_follow_lists
+
+    with _lock:
+        snapshot = _ensure_loaded()
+    if _unchanged_lists(snapshot, probe_follow_lists()) != {'followers', 'following'}:
+        _record_probe(0)
+        return None
+    _record_probe(2)
+    with _lock:
+        return _ensure_loaded()
+
+
+def get_changed_lists(probe: Optional[Dict[str, Any]]) -> Set[str]:
+    """Names of the lists a probe result shows have changed since the stored snapshot.
+
+    Both lists count as changed when there is no snapshot or the probe failed.
+    """
+    with _lock:
+        snapshot = _ensure_loaded()
+    return {'followers', 'following'} - _unchanged_lists(snapshot, probe)
+
+
+def get_probe_stats() -> Dict[str, Any]:
+    """Return how many probes ran and how many list walks they saved."""
+    with _lock:
+        snapshot = _ensure_loaded()
+        return {
+            'version': snapshot.get('version'),
+            'taken_at': snapshot.get('taken_at'),
+            'walked_at': snapshot.get('walked_at'),
+            **_load_probe_stats(),
+        }
+
+
+def get_fresh_follower_set(max_age: Optional[int] = None) -> Optional[Set[str]]:
+    """Return the lowercased follower logins if the snapshot is recent enough.
+
+    Returns:
+        A set of logins, or None when there is no snapshot or it is older than
+        max_age (SNAPSHOT_TTL by default).
+    """
+    max_age = SNAPSHOT_TTL if max_age is None else max_age
+    with _lock:
+        snapshot = _ensure_loaded()
+        taken_at = snapshot.get('taken_at')
+        if taken_at is None or time.time() - taken_at > max_age:
+            return None
+        return {user.login.lower() for user in snapshot.get('followers', [])}
+
+
+def apply_unfollow(login: str) -> None:
+    """Drop a user we just unfollowed from the following list and its views."""
+    key = login.lower()
+    with _lock:
+        snapshot = _ensure_loaded()
+        if not snapshot:
+            return
+        following = [user for user in snapshot['following'] if user.login.lower() != key]
+        if len(following) == len(snapshot['following']):
+            return
+        views = dict(snapshot['views'])
+        views['not_following_back'] = [row for row in views['not_following_back'] if row.login.lower() != key]
+        views['not_following_back_unenriched'] = count_unenriched(views['not_following_back'])
+        # Remembered until the next sync is saved, so a walk already under way can't bring the user back
+        recent_unfollows = dict(snapshot.get('recent_unfollows', {}), **{key: time.time()})
+        # Replace rather than mutate, so readers holding the old snapshot see a consistent copy
+        _save(dict(snapshot, version=snapshot['version'] + 1, following=following, views=views,
+                   recent_unfollows=recent_unfollows))
+    # Recorded now, since the next sync won't see the user go
+    change_log.record([('unfollowed', login)])
+
+
+def mark_stale() -> None:
+    """Make the next read sync, e.g. after following someone new."""
+    with _lock:
+        snapshot = _ensure_loaded()
+        if snapshot and not snapshot.get('stale'):
+            _save(dict(snapshot, stale=True, stale_at=time.time()))
@@ -82,19 +82,34 @@ function showNotification(message, type = 'info') {
     }, 5000);
 }
 
-// Update dashboard summary
-function updateDashboardSummary() {
-    document.getElementById('followers-count-summary').textContent = 
-        document.getElementById('followers-count').textContent;
-    document.getElementById('following-count-summary').textContent = 
-        document.getElementById('following-count').textContent;
-    document.getElementById('new-followers-count-summary').textContent = 
-        document.getElementById('new-followers-count').textContent;
-    document.getElementById('unfollowers-count-summary').textContent = 
-        document.getElementById('unfollowers-count').textContent;
+// Update dashboard summary from /api/summary, which returns counts without loading any list
+async function updateDashboardSummary() {
+    const cards = {
+        'followers': 'followers-count-summary',
+        'following': 'following-count-summary',
+        'new_followers': 'new-followers-count-summary',
+        'unfollowers': 'unfollowers-count-summary',
+        'not_following_back': 'not-following-back-count-summary'
+    };
+
+    try {
+        const response = await fetch('/api/summary', { cache: 'no-cache' });
+        if (!response.ok) {
+            throw new Error(`Server responded with status: ${response.status}`);
+        }
+        const summary = await response.json();
+        Object.entries(cards).forEach(([key, id]) => {
+            // null means no snapshot has been taken yet
+            document.getElementById(id).textContent = summary[key] === null ? '–' : summary[key];
+        });
+    } catch (error) {
+        console.error('Error loading dashboard summary:', error);
+    }
 }
 
 document.addEventListener('DOMContentLoaded', function() {
+    updateDashboardSummary();
+
     // Apply saved theme
     const savedTheme = localStorage.getItem('theme');
     if (savedTheme === 'light') {
@@ -120,6 +135,13 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     });
 
+    // Every list in one request. Suggested users are left out: they are a fresh
+    // random search each time, loaded from their own tab when wanted.
+    document.getElementById('load-all-button').addEventListener('click', function() {
+        fetchData(['followers', 'following', 'new_followers', 'unfollowers',
+                   'not_following_back', 'users_more_following']);
+    });
+
     // Handle bulk follow/unfollow buttons
     document.getElementById('follow-all-new-followers-button').addEventListener('click', function() {
         bulkAction('new-followers-list', '/bulk_follow');
@@ -152,14 +174,77 @@ document.addEventListener('DOMContentLoaded', function() {
 
     // Handle Search Form Submission
     const searchForm = document.getElementById('search-form');
+    const searchInput = document.getElementById('search-username');
+
+    // Text inputs drop newlines on paste, so turn a pasted column of names into a comma list
+    searchInput.addEventListener('paste', function(event) {
+        const pasted = (event.clipboardData || window.clipboardData).getData('text');
+        if (/[\r\n]/.test(pasted)) {
+            event.preventDefault();
+            const names = pasted.split(/[\s,]+/).filter(Boolean).join(', ');
+            const start = this.selectionStart;
+            const end = this.selectionEnd;
+            this.value = this.value.slice(0, start) + names + this.value.slice(end);
+        }
+    });
+
     searchForm.addEventListener('submit', function(event) {
         event.preventDefault();
-        const username = document.getElementById('search-username').value.trim();
-        if (username) {
-            searchUser(username);
+        const usernames = searchInput.value.split(/[\s,;]+/)
+            .map(name => name.trim().replace(/^@/, ''))
+            .filter(Boolean);
+        if (usernames.length === 1) {
+            searchUser(usernames[0]);
+        } else if (usernames.length > 1) {
+            searchUsers(usernames);
         }
     });
 
+    async function searchUsers(usernames) {
+        const searchResultDiv = document.getElementById('search-result');
+        try {
+            showLoadingIndicator();
+            const response = await fetch('/api/check_follow_bulk', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({ usernames: usernames })
+            });
+            const data = await response.json();
+            if (data.error) {
+                searchResultDiv.textContent = `Error: ${data.error}`;
+                return;
+            }
+
+            const entries = Object.entries(data.results);
+            const followCount = entries.filter(([, follows]) => follows === true).length;
+            searchResultDiv.innerHTML = '';
+
+            const summary = document.createElement('p');
+            summary.textContent = `${followCount} of ${entries.length} users follow you.`;
+            searchResultDiv.appendChild(summary);
+
+            const list = document.createElement('ul');
+            list.className = 'search-result-list';
+            entries.forEach(([username, follows]) => {
+                const li = document.createElement('li');
+                if (follows === null) {
+                    li.textContent = `${username}: user not found`;
+                } else {
+                    li.textContent = `${username} ${follows ? 'follows you' : 'does not follow you'}`;
+                }
+                list.appendChild(li);
+            });
+            searchResultDiv.appendChild(list);
+        } catch (error) {
+            console.error('Error searching users:', error);
+            searchResultDiv.textContent = `Error: ${error.message}`;
+        } finally {
+            hideLoadingIndicator();
+        }
+    }
+
     async function searchUser(username) {
         try {
             const response = await fetch(`/check_follow?username=${encodeURIComponent(username)}`);
@@ -176,10 +261,15 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    async function fetchData(dataType) {
+    async function fetchData(dataTypes) {
+        // One type or several; several are served together from /get_data?type=a,b,c
+        dataTypes = Array.isArray(dataTypes) ? dataTypes : [dataTypes];
+        const label = dataTypes.length === 1 ? dataTypes[0].replace('_', ' ') : 'All lists';
         try {
             showLoadingIndicator();
-            const response = await fetch(`/get_data?type=${dataType}`);
+            // Revalidate with the server every time; the browser sends If-None-Match and
+            // serves its cached copy transparently when the server answers 304 Not Modified.
+            const response = await fetch(`/get_data?type=${dataTypes.join(',')}`, { cache: 'no-cache' });
 
             if (!response.ok) {
                 throw new Error(`Server responded with status: ${response.status}`);
@@ -192,9 +282,13 @@ document.addEventListener('DOMContentLoaded', function() {
                 return;
             }
 
-            populateData(dataType, data);
-            updateDashboardSummary();
-            showNotification(`${dataType.replace('_', ' ')} data loaded successfully`, 'success');
+            dataTypes.forEach(dataType => populateData(dataType, data));
+            if (data.partial) {
+                // The server ran out of time talking to GitHub and sent what it had
+                showNotification(`${label} ${dataTypes.length === 1 ? 'is' : 'are'} incomplete; GitHub was slow. Load again for the rest.`, 'warning');
+            } else {
+                showNotification(`${label} data loaded successfully`, 'success');
+            }
         } catch (error) {
             console.error('Error fetching data:', error);
             showNotification(`Failed to load data: ${error.message}`, 'error');
@@ -0,0 +1,126 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# GitHub's default hourly GraphQL/REST budget for a personal access token
+DEFAULT_HOURLY_LIMIT = 5000
+
+
+class TokenState:
+    """Rate-limit bookkeeping for a single GitHub token."""
+
+    __slots__ = ('token', 'label', 'limit', 'remaining', 'reset_at', 'reserve', 'requests')
+
+    def __init__(self, token: str, label: str, reserve: int = 0):
+        self.token = token
+        self.label = label
+        self.limit = DEFAULT_HOURLY_LIMIT
+        # Unknown until the first response comes back; assume a full budget
+        self.remaining = DEFAULT_HOURLY_LIMIT
+        self.reset_at = 0.0
+        self.reserve = reserve
+        self.requests = 0
+
+    def headroom(self, now: float) -> int:
+        """Points this token can still spend on reads, after its reserve."""
+        remaining = self.limit if now >= self.reset_at else self.remaining
+        return remaining - self.reserve
+
+    @property
+    def auth_header(self) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def to_dict(self, now: float) -> Dict[str, Any]:
+        return {
+            'token': self.label,
+            'limit': self.limit,
+            'remaining': self.remaining,
+            'reset_at': self.reset_at,
+            'reserve': self.reserve,
+            'headroom': self.headroom(now),
+            'requests': self.requests,
+        }
+
+
+def _mask(token: str) -> str:
+    return f"...{token[-4:]}" if len(token) > 4 else '...'
+
+
+class TokenPool:
+    """Spread read-only requests across several tokens by remaining budget.
+
+    The first token is the owner token. It is the only one used for mutations and
+    viewer-relative queries, so the pool keeps `owner_reserve` of its points back
+    from reads.
+    """
+
+    def __init__(self, tokens: Sequence[str], owner_reserve: int = 0):
+        unique = []
+        for token in tokens:
+            token = token.strip()
+            if token and token not in unique:
+                unique.append(token)
+        if not unique:
+            raise ValueError('TokenPool needs at least one token')
+
+        self._lock = threading.Lock()
+        self.owner = TokenState(unique[0], f'owner({_mask(unique[0])})', reserve=owner_reserve)
+        self._states: List[TokenState] = [self.owner] + [
+            TokenState(token, _mask(token)) for token in unique[1:]
+        ]
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def acquire(self) -> TokenState:
+        """Return the token with the most headroom for a read-only request."""
+        now = time.time()
+        with self._lock:
+            best = max(self._states, key=lambda state: state.headroom(now))
+            best.requests += 1
+            # Optimistically spend one point so concurrent callers spread out
+            # before the response headers arrive.
+            if now < best.reset_at:
+                best.remaining -= 1
+            return best
+
+    def acquire_owner(self) -> TokenState:
+        """Return the owner token, for mutations and viewer-relative queries."""
+        with self._lock:
+            self.owner.requests += 1
+            return self.owner
+
+    def update(self, state: TokenState, headers: Mapping[str, str]) -> None:
+        """Record the budget GitHub reported in a response's rate-limit headers."""
+        remaining = headers.get('X-RateLimit-Remaining')
+        if remaining is None:
+            return
+        try:
+            with self._lock:
+                state.remaining = int(remaining)
+                state.limit = int(headers.get('X-RateLimit-Limit', state.limit))
+                state.reset_at = float(headers.get('X-RateLimit-Reset', state.reset_at))
+        except (TypeError, ValueError):
+            logger.debug(f"Ignoring malformed rate-limit headers for token {state.label}")
+
+    def best_headroom(self) -> int:
+        """Headroom of the best read token right now."""
+        now = time.time()
+        with self._lock:
+            return max(state.headroom(now) for state in self._states)
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Per-token budget snapshot, with tokens masked."""
+        now = time.time()
+        with self._lock:
+            return [state.to_dict(now) for state in self._states]
+
+
+def parse_tokens(value: Optional[str]) -> List[str]:
+    """Split a comma-separated token list from config."""
+    if not value:
+        return []
+    return [token.strip() for token in value.split(',') if token.strip()]
@@ -0,0 +1,196 @@
+import contextvars
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
+from typing import Any, Dict, List, Optional
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+slow_query_logger = logging.getLogger('slow_queries')
+
+# Number of finished root traces kept in memory for /debug/traces
+TRACE_BUFFER_SIZE = config('TRACE_BUFFER_SIZE', default=100, cast=int)
+# GraphQL attempts slower than this (in milliseconds) are written to the slow-query log
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=2000, cast=float)
+SLOW_QUERY_BUFFER_SIZE = config('SLOW_QUERY_BUFFER_SIZE', default=200, cast=int)
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar('current_span', default=None)
+
+_buffer_lock = threading.Lock()
+_traces = deque(maxlen=TRACE_BUFFER_SIZE)
+_slow_queries = deque(maxlen=SLOW_QUERY_BUFFER_SIZE)
+
+
+class Span:
+    """A timed unit of work with attributes and child spans."""
+
+    __slots__ = ('trace_id', 'span_id', 'parent_id', 'name', 'attributes',
+                 'started_at', 'start', 'end', 'children', 'error')
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None,
+                 attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.end = None
+        self.children: List['Span'] = []
+        self.error = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = f'{type(error).__name__}: {error}'
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 2),
+            'attributes': self.attributes,
+            'error': self.error,
+            'children': [child.to_dict() for child in list(self.children)],
+        }
+
+
+def current_span() -> Optional[Span]:
+    """Return the span active in the current context, if any."""
+    return _current_span.get()
+
+
+def begin_trace(name: str, **attributes):
+    """Open a root span (or a child if a trace is already active).
+
+    Returns the span and the context token needed by end_trace().
+    """
+    parent = _current_span.get()
+    if parent is not None:
+        new_span = Span(name, parent.trace_id, parent.span_id, attributes)
+        parent.children.append(new_span)
+    else:
+        new_span = Span(name, uuid.uuid4().hex, None, attributes)
+    token = _current_span.set(new_span)
+    return new_span, token
+
+
+def end_trace(root: Span, token, error: Optional[BaseException] = None) -> None:
+    """Close a span opened with begin_trace() and store it if it was a root."""
+    root.finish(error)
+    _current_span.reset(token)
+    if root.parent_id is None:
+        with _buffer_lock:
+            _traces.append(root)
+        logger.debug(f"Trace {root.name} finished in {root.duration_ms:.0f} ms")
+
+
+@contextmanager
+def start_trace(name: str, **attributes):
+    """Context manager that opens a root span for a request or job."""
+    root, token = begin_trace(name, **attributes)
+    try:
+        yield root
+    except BaseException as e:
+        end_trace(root, token, e)
+        raise
+    else:
+        end_trace(root, token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Context manager that records a child span of the active span.
+
+    Outside of a trace the span is still timed but not stored anywhere.
+    """
+    parent = _current_span.get()
+    if parent is None:
+        new_span = Span(name, '', None, attributes)
+    else:
+        new_span = Span(name, parent.trace_id, parent.span_id, attributes)
+        parent.children.append(new_span)
+    token = _current_span.set(new_span)
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.finish(e)
+        raise
+    else:
+        new_span.finish()
+    finally:
+        _current_span.reset(token)
+
+
+def traced(name: str):
+    """Decorator that records each call of the wrapped function as a child span."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_job(func):
+    """Decorator that runs a scheduler job inside its own root span."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with start_trace(f'job:{func.__name__}'):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def record_slow_query(description: str, duration_ms: float, **attributes) -> None:
+    """Add a GraphQL attempt to the slow-query log if it exceeded the threshold."""
+    if duration_ms < SLOW_QUERY_THRESHOLD_MS:
+        return
+    active = _current_span.get()
+    entry = {
+        'query': description,
+        'duration_ms': round(duration_ms, 2),
+        'recorded_at': time.time(),
+        'trace_id': active.trace_id if active else None,
+        'attributes': attributes,
+    }
+    with _buffer_lock:
+        _slow_queries.append(entry)
+    slow_query_logger.warning(f"Slow GraphQL query ({duration_ms:.0f} ms): {description}")
+
+
+def get_recent_traces(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return the most recent finished traces, newest first."""
+    with _buffer_lock:
+        traces = list(_traces)
+    traces.reverse()
+    if limit is not None:
+        traces = traces[:limit]
+    return [t.to_dict() for t in traces]
+
+
+def get_slow_queries(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Return the most recent slow-query log entries, newest first."""
+    with _buffer_lock:
+        entries = list(_slow_queries)
+    entries.reverse()
+    if limit is not None:
+        entries = entries[:limit]
+    return entries
@@ -0,0 +1,187 @@
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import timedelta
+from typing import Any, Dict, Optional, Sequence
+from urllib.parse import urlsplit
+
+import requests
+from decouple import config
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+# live (default): talk to GitHub; record: talk to GitHub and save every exchange;
+# replay: serve saved exchanges without touching the network
+GITHUB_TRANSPORT = config('GITHUB_TRANSPORT', default='live')
+GITHUB_CASSETTE = config('GITHUB_CASSETTE', default='github_cassette.jsonl')
+# Replay delay as a multiple of the recorded latency: 1 = original timing, 0 = no delay
+GITHUB_REPLAY_TIMING = config('GITHUB_REPLAY_TIMING', default=1.0, cast=float)
+
+# Response headers worth keeping; anything else (cookies, request IDs) is dropped
+_RECORDED_HEADERS = ('Content-Type', 'Retry-After', 'X-RateLimit-Limit', 'X-RateLimit-Remaining',
+                     'X-RateLimit-Reset', 'X-RateLimit-Used', 'X-RateLimit-Resource')
+
+
+def _body_text(body: Any) -> str:
+    if body is None:
+        return ''
+    if isinstance(body, bytes):
+        return body.decode('utf-8', errors='replace')
+    return str(body)
+
+
+def _canonical_body(body: str) -> str:
+    """Normalize a JSON request body so key order doesn't affect matching."""
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(',', ':'))
+    except ValueError:
+        return body
+
+
+def _shape_key(method: str, url: str, body: str) -> str:
+    """Looser match: same endpoint and GraphQL document, any variables or query string."""
+    try:
+        document = ' '.join(json.loads(body).get('query', '').split())
+    except (ValueError, AttributeError):
+        document = ''
+    return f"{method} {urlsplit(url).path} {document}"
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that appends every request/response pair to a JSON-lines cassette.
+
+    Request headers are never written, so the Authorization token stays out of
+    the cassette; any of `secrets` found in URLs or bodies is masked as well.
+    """
+
+    def __init__(self, cassette_path: str, secrets: Sequence[str] = (), **kwargs):
+        super().__init__(**kwargs)
+        self.cassette_path = cassette_path
+        self.secrets = [secret for secret in secrets if secret]
+        self._write_lock = threading.Lock()
+
+    def _scrub(self, text: str) -> str:
+        for secret in self.secrets:
+            text = text.replace(secret, '<redacted>')
+        return text
+
+    def send(self, request, **kwargs):
+        started_at = time.time()
+        timer = time.perf_counter()
+        response = super().send(request, **kwargs)
+        response.content  # Read the body now so the round trip includes it
+        # Session.send sets response.elapsed only after the adapter returns, so time it here
+        elapsed = time.perf_counter() - timer
+        entry = {
+            'method': request.method,
+            'url': self._scrub(request.url),
+            'body': self._scrub(_body_text(request.body)),
+            'status': response.status_code,
+            'headers': {name: response.headers[name] for name in _RECORDED_HEADERS if name in response.headers},
+            'response': self._scrub(response.text),
+            'started_at': started_at,
+            'elapsed': round(elapsed, 4),
+        }
+        with self._write_lock:
+            with open(self.cassette_path, 'a', encoding='utf-8') as cassette:
+                cassette.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        return response
+
+
+class ReplayAdapter(BaseAdapter):
+    """Serve responses from a cassette written by RecordingAdapter.
+
+    Requests are matched exactly (method, URL and JSON body) first, then by
+    endpoint and GraphQL document, so queries with random parameters (such as the
+    `since` offset of the user listing) still replay. Repeated matches are served
+    in recorded order; the last one is reused once they run out.
+    """
+
+    def __init__(self, cassette_path: str, timing: float = 1.0):
+        super().__init__()
+        self.timing = timing
+        self._lock = threading.Lock()
+        self._exact = defaultdict(deque)
+        self._by_shape = defaultdict(deque)
+        self._last: Dict[str, Dict[str, Any]] = {}
+
+        count = 0
+        with open(cassette_path, 'r', encoding='utf-8') as cassette:
+            for line in cassette:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                body = entry.get('body', '')
+                self._exact[self._exact_key(entry['method'], entry['url'], body)].append(entry)
+                self._by_shape[_shape_key(entry['method'], entry['url'], body)].append(entry)
+                count += 1
+        logger.info(f"Loaded {count} recorded exchanges from {cassette_path}")
+
+    @staticmethod
+    def _exact_key(method: str, url: str, body: str) -> str:
+        return f"{method} {url} {_canonical_body(body)}"
+
+    def _next_entry(self, key: str, queues) -> Optional[Dict[str, Any]]:
+        pending = queues.get(key)
+        if pending:
+            entry = pending.popleft()
+            self._last[key] = entry
+            return entry
+        return self._last.get(key)
+
+    def send(self, request, **kwargs):
+        body = _body_text(request.body)
+        exact_key = self._exact_key(request.method, request.url, body)
+        shape_key = _shape_key(request.method, request.url, body)
+
+        with self._lock:
+            entry = self._next_entry(exact_key, self._exact) or self._next_entry(shape_key, self._by_shape)
+
+        if entry is None:
+            raise requests.exceptions.ConnectionError(
+                f"No recorded response for {request.method} {request.url}", request=request)
+
+        delay = entry.get('elapsed', 0) * self.timing
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry.get('headers', {}))
+        response._content = entry['response'].encode('utf-8')
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.elapsed = timedelta(seconds=delay)
+        return response
+
+    def close(self):
+        pass
+
+
+def install_transport(session: requests.Session, mode: Optional[str] = None,
+                      cassette_path: Optional[str] = None, timing: Optional[float] = None,
+                      secrets: Sequence[str] = ()) -> str:
+    """Mount a recording or replaying transport for HTTPS on the given session.
+
+    `secrets` (the API tokens) are masked in anything written to a cassette.
+
+    Returns:
+        The transport mode in effect.
+    """
+    mode = (mode or GITHUB_TRANSPORT).lower()
+    cassette_path = cassette_path or GITHUB_CASSETTE
+
+    if mode == 'record':
+        session.mount('https://', RecordingAdapter(cassette_path, secrets))
+        logger.warning(f"Recording GitHub traffic to {cassette_path}")
+    elif mode == 'replay':
+        session.mount('https://', ReplayAdapter(cassette_path, GITHUB_REPLAY_TIMING if timing is None else timing))
+        logger.warning(f"Replaying GitHub traffic from {cassette_path}; no requests reach the network")
+    elif mode != 'live':
+        raise ValueError(f"Unknown GITHUB_TRANSPORT mode: {mode}")
+    return mode
@@ -1,9 +1,18 @@
 import os
 import json
+import contextvars
 import logging
 import tempfile
+from contextlib import contextmanager
 from typing import Any, Dict, Iterator, List, Sequence
 
+from records import to_json_default
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to the standard library encoder
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
 # Allow overriding the cache location via environment variable while preserving the default name
@@ -19,6 +28,16 @@ def _get_cache_file_path() -> str:
     return os.path.abspath(CACHE_FILE)
 
 
+def dumps(payload: Any) -> bytes:
+    """Serialize a payload to compact UTF-8 JSON, using orjson when installed.
+
+    User records (see records.py) are serialized in place through their to_json.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload, default=to_json_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, default=to_json_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
 def chunks(lst: Sequence[Any], n: int) -> Iterator[List[Any]]:
     """Yield successive n-sized chunks from lst.
 
@@ -40,44 +59,79 @@ def chunks(lst: Sequence[Any], n: int) -> Iterator[List[Any]]:
         yield list(lst[i:i + n])
 
 
-def load_cache() -> Dict[str, Any]:
-    """Load cache from disk.
+def summarize_results(results: Dict[str, Dict[str, Any]], max_failures: int = 10) -> Dict[str, Any]:
+    """Condense a {username: {'success': bool, 'message': str}} dict for logging.
 
     Returns:
-        A dictionary of cached values. Returns an empty dict if the file does not
-        exist, is invalid JSON, or cannot be read.
+        Counts plus at most max_failures failing usernames with their messages, so
+        log lines stay the same size however many users a bulk job touched.
     """
-    path = _get_cache_file_path()
-    logger.debug(f"Loading cache from {path}")
+    failures = [(username, outcome.get('message', '')) for username, outcome in results.items()
+                if not outcome.get('success')]
+    return {
+        'total': len(results),
+        'succeeded': len(results) - len(failures),
+        'failed': len(failures),
+        'failures': dict(failures[:max_failures]),
+        'failures_truncated': len(failures) > max_failures,
+    }
+
+
+def preview(items: Sequence[Any], limit: int = 10) -> str:
+    """Render the first few items of a sequence and how many were left out."""
+    shown = ', '.join(str(item) for item in items[:limit])
+    hidden = len(items) - limit
+    return f"{shown} (+{hidden} more)" if hidden > 0 else shown
+
+
+def submit_with_context(executor, fn, *args, **kwargs):
+    """Submit fn to an executor so it runs in a copy of the caller's context.
+
+    Context variables (such as the active tracing span) are not inherited by
+    pool threads, so each task gets its own snapshot of the submitting context.
+    """
+    ctx = contextvars.copy_context()
+    return executor.submit(ctx.run, fn, *args, **kwargs)
+
+
+def load_json_file(path: str) -> Dict[str, Any]:
+    """Load a JSON object from disk.
+
+    Returns:
+        The decoded object. Returns an empty dict if the file does not exist, is
+        invalid JSON, its root is not an object, or it cannot be read.
+    """
+    path = os.path.abspath(path)
+    logger.debug(f"Loading JSON from {path}")
 
     if not os.path.exists(path):
-        logger.debug("Cache file not found")
+        logger.debug(f"JSON file not found: {path}")
         return {}
 
     try:
         with open(path, 'r', encoding='utf-8') as file:
             data = json.load(file)
             if isinstance(data, dict):
-                logger.debug(f"Loaded cache with {len(data)} entries")
+                logger.debug(f"Loaded {len(data)} entries from {path}")
                 return data
             else:
-                logger.warning("Cache file JSON root is not an object; resetting cache to empty")
+                logger.warning(f"JSON root in {path} is not an object; resetting to empty")
                 return {}
     except json.JSONDecodeError:
-        logger.error(f"Failed to decode cache JSON at {path}; resetting to empty")
+        logger.error(f"Failed to decode JSON at {path}; resetting to empty")
         return {}
     except OSError as e:
-        logger.error(f"Error reading cache file {path}: {e}")
+        logger.error(f"Error reading JSON file {path}: {e}")
         return {}
 
 
-def save_cache(cache: Dict[str, Any]) -> None:
-    """Persist cache to disk atomically.
+def save_json_file(path: str, data: Dict[str, Any]) -> None:
+    """Persist a JSON object to disk atomically.
 
     Writes to a temporary file and then replaces the target to avoid partial writes.
     """
-    path = _get_cache_file_path()
-    logger.debug(f"Saving cache with {len(cache)} entries to {path}")
+    path = os.path.abspath(path)
+    logger.debug(f"Saving {len(data)} entries to {path}")
 
     # Ensure directory exists
     directory = os.path.dirname(path)
@@ -90,17 +144,64 @@ def save_cache(cache: Dict[str, Any]) -> None:
                                          prefix=os.path.basename(path) + '.', suffix='.tmp') as tf:
             tmp_file = tf.name
             # Compact JSON for smaller file size
-            json.dump(cache, tf, ensure_ascii=False, separators=(',', ':'))
+            json.dump(data, tf, ensure_ascii=False, separators=(',', ':'))
             tf.flush()
             os.fsync(tf.fileno())
         # Atomic replace
         os.replace(tmp_file, path)
-        logger.debug("Cache saved successfully")
+        logger.debug(f"Saved {path} successfully")
     except OSError as e:
-        logger.error(f"Failed to save cache to {path}: {e}")
+        logger.error(f"Failed to save {path}: {e}")
         # Best effort cleanup of temp file
         if tmp_file and os.path.exists(tmp_file):
             try:
                 os.remove(tmp_file)
             except OSError:
                 pass
+
+
+@contextmanager
+def file_lock(path: str) -> Iterator[None]:
+    """Hold an exclusive OS lock on `path` + '.lock' for the enclosed block.
+
+    For files that web workers and the scheduler process all read, change and
+    write back. The lock file is separate because save_json_file replaces the
+    target, which would drop a lock held on it.
+    """
+    handle = open(os.path.abspath(path) + '.lock', 'a+')
+    try:
+        if os.name == 'nt':
+            import msvcrt
+            handle.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after about 10 seconds; keep waiting
+                    msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    continue
+        else:
+            import fcntl
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+        yield
+        if os.name == 'nt':
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+    finally:
+        # Closing the handle releases the lock (flock) if it is still held
+        handle.close()
+
+
+def load_cache() -> Dict[str, Any]:
+    """Load cache from disk.
+
+    Returns:
+        A dictionary of cached values. Returns an empty dict if the file does not
+        exist, is invalid JSON, or cannot be read.
+    """
+    return load_json_file(_get_cache_file_path())
+
+
+def save_cache(cache: Dict[str, Any]) -> None:
+    """Persist cache to disk atomically."""
+    save_json_file(_get_cache_file_path(), cache)
@@ -0,0 +1,110 @@
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Sequence
+
+from decouple import config
+
+from records import FollowingEdge, UserProfile, UserSummary
+
+logger = logging.getLogger(__name__)
+
+# Minimum following - followers difference for the "Following > Followers" view
+USERS_MORE_FOLLOWING_MIN_DIFFERENCE = config('USERS_MORE_FOLLOWING_MIN_DIFFERENCE', default=25, cast=int)
+
+
+def by_login(records: Iterable[Any]) -> Dict[str, Any]:
+    """Index records by lowercased login."""
+    return {record.login.lower(): record for record in records}
+
+
+def _counts(user: UserSummary):
+    return user.followers, user.following
+
+
+def qualifies_for_more_following(follower: UserSummary) -> bool:
+    """Whether a follower belongs in the "Following > Followers" view."""
+    return follower.difference >= USERS_MORE_FOLLOWING_MIN_DIFFERENCE
+
+
+def refresh_users_more_following(previous_view: Iterable[str],
+                                 previous_followers: Dict[str, UserSummary],
+                                 followers: Dict[str, UserSummary]) -> List[UserSummary]:
+    """Update the view for followers that were added, removed or changed counts.
+
+    The view holds the follower records themselves, so no rows are copied.
+    """
+    members = set(previous_view)
+    members -= previous_followers.keys() - followers.keys()
+
+    for login, follower in followers.items():
+        before = previous_followers.get(login)
+        if before is not None and _counts(before) == _counts(follower):
+            # Unchanged follower: its membership is still correct
+            continue
+        if qualifies_for_more_following(follower):
+            members.add(login)
+        else:
+            members.discard(login)
+
+    # Sort users by the biggest difference
+    return sorted((followers[login] for login in members if login in followers),
+                  key=lambda follower: follower.difference, reverse=True)
+
+
+def refresh_not_following_back(previous_view: Sequence[UserProfile],
+                               followers: Dict[str, UserSummary],
+                               following: Sequence[FollowingEdge],
+                               enrich: Callable[[List[str]], List[UserProfile]]) -> List[UserProfile]:
+    """Recompute who we follow that doesn't follow back, with a profile for each.
+
+    `enrich` is called once with every login in the view. With the profile cache
+    that costs nothing for users it already holds and lets it refresh stale ones
+    in the background, so repos and counts don't freeze at their first fetch.
+    A user `enrich` returns nothing for keeps their previous row.
+    """
+    # Rows that fell back to the following walk's fields aren't worth keeping
+    previous_rows = by_login(row for row in previous_view if row.public_repos is not None)
+    not_following_back = [user for user in following if user.login.lower() not in followers]
+
+    logins = [user.login for user in not_following_back]
+    enriched = by_login(enrich(logins)) if logins else {}
+    logger.debug(f"not_following_back: {len(not_following_back)} rows, {len(enriched)} enriched")
+
+    rows = []
+    for user in not_following_back:
+        login = user.login.lower()
+        row = enriched.get(login) or previous_rows.get(login)
+        if row is None:
+            # Enrichment failed for this user; fall back to what the following walk gave us
+            row = UserProfile(user.login, type=user.type, followers=user.followers, following=user.following)
+        rows.append(row)
+    return rows
+
+
+def count_unenriched(rows: Iterable[UserProfile]) -> int:
+    """Rows left with only the following walk's fields, e.g. because the deadline cut enrichment short."""
+    return sum(1 for row in rows if row.public_repos is None)
+
+
+def refresh_views(previous: Dict[str, Any], followers: Sequence[UserSummary],
+                  following: Sequence[FollowingEdge],
+                  enrich: Callable[[List[str]], List[UserProfile]]) -> Dict[str, Any]:
+    """Bring the derived views of a previous snapshot up to date with a new one."""
+    previous_views = previous.get('views', {})
+    current_followers = by_login(followers)
+
+    # Without a previous view built with the same threshold, rebuild it from scratch
+    if previous_views.get('users_more_following_min_difference') == USERS_MORE_FOLLOWING_MIN_DIFFERENCE:
+        previous_followers = by_login(previous.get('followers', []))
+        previous_members = [follower.login.lower() for follower in previous_views.get('users_more_following', [])]
+    else:
+        previous_followers, previous_members = {}, []
+
+    not_following_back = refresh_not_following_back(
+        previous_views.get('not_following_back', []), current_followers, following, enrich)
+    return {
+        'users_more_following': refresh_users_more_following(
+            previous_members, previous_followers, current_followers),
+        'users_more_following_min_difference': USERS_MORE_FOLLOWING_MIN_DIFFERENCE,
+        'not_following_back': not_following_back,
+        'not_following_back_unenriched': count_unenriched(not_following_back),
+    }
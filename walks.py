@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from decouple import config
+
+logger = logging.getLogger(__name__)
+
+# Directory holding one JSON-lines checkpoint per interrupted followers/following walk
+WALK_CHECKPOINT_DIR = config('WALK_CHECKPOINT_DIR', default='walk_checkpoints')
+# Checkpoints older than this are thrown away and the walk starts over (seconds)
+WALK_CHECKPOINT_TTL = config('WALK_CHECKPOINT_TTL', default=60 * 60, cast=int)
+
+
+class IncompleteWalk(Exception):
+    """Raised when a followers/following walk fails before its last page."""
+
+
+class WalkResult(list):
+    """The users from a followers/following walk.
+
+    `complete` is False when the walk stopped before the last page; anything
+    that acts on what is missing from the list must not trust it then.
+    """
+
+    __slots__ = ('complete',)
+
+    def __init__(self, users=(), complete: bool = True):
+        super().__init__(users)
+        self.complete = complete
+
+
+# Each line is one page: {'after': cursor it was fetched from, 'cursor': its end
+# cursor, 'users': [record JSON], 'saved_at': time}. Pages are appended as they
+# arrive, so checkpointing costs one small write per page however long the walk.
+_write_lock = threading.Lock()
+
+
+def _path(key: str) -> str:
+    return os.path.join(WALK_CHECKPOINT_DIR, re.sub(r'[^A-Za-z0-9_.-]', '_', key) + '.jsonl')
+
+
+def load_checkpoint(key: str) -> Optional[Tuple[Optional[str], List[Dict[str, Any]]]]:
+    """Return (cursor to resume after, users so far) from a walk's checkpoint, if it has one.
+
+    Pages are chained by cursor starting from the first page, so lines left by an
+    overlapping walk of the same list are skipped rather than duplicated.
+    """
+    path = _path(key)
+    try:
+        if time.time() - os.path.getmtime(path) > WALK_CHECKPOINT_TTL:
+            logger.info(f"Walk checkpoint {path} is too old; starting over")
+            clear_checkpoint(key)
+            return None
+        with open(path, 'r', encoding='utf-8') as file:
+            lines = file.readlines()
+    except OSError:
+        return None
+
+    pages = {}
+    for line in lines:
+        try:
+            page = json.loads(line)
+        except ValueError:
+            # A line cut short by a crash; everything before it is still good
+            break
+        pages.setdefault(page['after'], page)
+
+    cursor, users = None, []
+    while cursor in pages:
+        page = pages.pop(cursor)
+        users.extend(page['users'])
+        cursor = page['cursor']
+    if not users:
+        return None
+    return cursor, users
+
+
+def save_page(key: str, after: Optional[str], cursor: str, users: List[Dict[str, Any]]) -> None:
+    """Record one page of a walk: the cursor it was fetched after, its end cursor and its users."""
+    line = json.dumps({'after': after, 'cursor': cursor, 'users': users, 'saved_at': time.time()},
+                      ensure_ascii=False, separators=(',', ':'))
+    with _write_lock:
+        try:
+            os.makedirs(WALK_CHECKPOINT_DIR, exist_ok=True)
+            with open(_path(key), 'a', encoding='utf-8') as file:
+                file.write(line + '\n')
+        except OSError as e:
+            # Only resuming is lost; the walk itself carries on
+            logger.error(f"Failed to write walk checkpoint for {key}: {e}")
+
+
+def clear_checkpoint(key: str) -> None:
+    """Drop the checkpoint of a walk that finished (or can't be resumed)."""
+    with _write_lock:
+        try:
+            os.remove(_path(key))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Failed to remove walk checkpoint for {key}: {e}")
@@ -0,0 +1,96 @@
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from decouple import config
+
+from tracing import traced_job
+from utils import load_json_file, save_json_file
+
+logger = logging.getLogger(__name__)
+
+# How often the warmer refreshes dashboard data (minutes); keep it under SNAPSHOT_TTL
+WARMER_INTERVAL_MINUTES = config('WARMER_INTERVAL_MINUTES', default=9, cast=int)
+# Skip warming when nobody has opened the dashboard for this long (hours)
+WARMER_IDLE_HOURS = config('WARMER_IDLE_HOURS', default=12, cast=float)
+# Largest share of the hourly rate budget (all tokens together) the warmer may spend
+WARMER_BUDGET_SHARE = config('WARMER_BUDGET_SHARE', default=0.2, cast=float)
+# Time of the last dashboard request, shared between web workers and the scheduler
+DASHBOARD_ACTIVITY_FILE = config('DASHBOARD_ACTIVITY_FILE', default='dashboard_activity.json')
+
+# Dashboard hits are written at most this often (seconds) per process
+_HIT_WRITE_INTERVAL = 60
+
+_hit_lock = threading.Lock()
+_last_hit_written = 0.0
+# Points the warmer spent in the current hour: {'hour': n, 'points': n}
+_spent = {'hour': None, 'points': 0}
+
+
+def record_dashboard_hit() -> None:
+    """Note that someone is using the dashboard, so the warmer keeps its data fresh."""
+    global _last_hit_written
+
+    now = time.time()
+    with _hit_lock:
+        if now - _last_hit_written < _HIT_WRITE_INTERVAL:
+            return
+        _last_hit_written = now
+    save_json_file(DASHBOARD_ACTIVITY_FILE, {'last_hit_at': now})
+
+
+def last_dashboard_hit() -> Optional[float]:
+    return load_json_file(DASHBOARD_ACTIVITY_FILE).get('last_hit_at')
+
+
+def _budget():
+    """Total (headroom, limit) across all tokens, as tracked from response headers."""
+    from github_api import get_token_pool_status
+
+    tokens = get_token_pool_status()
+    return sum(token['headroom'] for token in tokens), sum(token['limit'] for token in tokens)
+
+
+def _profile_logins(snapshot) -> List[str]:
+    """Logins whose profiles the New Followers and Unfollowers tabs will ask for."""
+    from data_manager import load_new_followers, load_previous_followers
+
+    current = {user.login for user in snapshot.get('followers', [])}
+    unfollowers = set(load_previous_followers()) - current
+    return list(load_new_followers().keys()) + sorted(unfollowers)
+
+
+@traced_job
+def warm_dashboard_caches():
+    """Refresh the snapshot, its views and profile enrichment ahead of dashboard requests."""
+    import profile_cache
+    import snapshot_store
+
+    now = time.time()
+    last_hit = last_dashboard_hit()
+    if last_hit is None or now - last_hit > WARMER_IDLE_HOURS * 3600:
+        logger.info(f"No dashboard requests in the last {WARMER_IDLE_HOURS:g} hours; not warming caches")
+        return
+
+    hour = int(now // 3600)
+    if _spent['hour'] != hour:
+        _spent['hour'], _spent['points'] = hour, 0
+    headroom_before, limit = _budget()
+    if _spent['points'] >= limit * WARMER_BUDGET_SHARE:
+        logger.info(f"Cache warmer already spent {_spent['points']} points this hour; skipping")
+        return
+
+    try:
+        # Sync unless the snapshot will still be fresh when the next run comes round; a
+        # snapshot that merely is fresh now would expire between runs and leave the
+        # cold sync to a dashboard request
+        max_age = max(0, snapshot_store.SNAPSHOT_TTL - WARMER_INTERVAL_MINUTES * 60)
+        snapshot = snapshot_store.get_snapshot(max_age=max_age)
+        profile_cache.get_profiles(_profile_logins(snapshot))
+    except Exception:
+        logger.exception("Error while warming dashboard caches")
+    finally:
+        spent = max(0, headroom_before - _budget()[0])
+        _spent['points'] += spent
+        logger.info(f"Cache warmer spent {spent} points ({_spent['points']} this hour)")